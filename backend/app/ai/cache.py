@@ -0,0 +1,244 @@
+# cache.py
+import os, time, json, hashlib, threading, asyncio, logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# 이름 → 캐시 인스턴스 (metrics 엔드포인트에서 한 번에 조회)
+CACHE_REGISTRY: Dict[str, "TwoTierCache"] = {}
+
+def stable_hash(obj: Any) -> str:
+    """dict/list 를 키 순서와 무관하게 해시 (캐시 키 지문용)"""
+    raw = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+class TTLLRUCache:
+    """프로세스 내부 LRU + TTL 캐시 (hit/miss/eviction 카운터 포함)"""
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()  # to_thread 로 호출되는 경우도 있어서 잠금
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: str, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hitRate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+class FirestoreStore:
+    """Firestore 컬렉션 기반 영속 캐시 계층 (문서 id = 키 해시)"""
+    def __init__(self, collection: str, ttl: float, db=None):
+        self.collection = collection
+        self.ttl = ttl
+        self._db = db
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def db(self):
+        if self._db is None:
+            from app.ai.fake_backends import backend_for, FakeFirestore
+            if backend_for("DB") == "fake":  # 오프라인 벤치마크용
+                self._db = FakeFirestore()
+            else:
+                from firebase_admin import firestore
+                self._db = firestore.client()
+        return self._db
+
+    def _doc(self, key: str):
+        doc_id = hashlib.sha1(key.encode("utf-8")).hexdigest()  # '/' 등 문서 id 금지 문자 회피
+        return self.db.collection(self.collection).document(doc_id)
+
+    def get(self, key: str):
+        """(value, expiresAt) - 없거나 만료면 _MISSING"""
+        try:
+            snap = self._doc(key).get()
+        except Exception as e:
+            self.errors += 1
+            logger.warning("cache store get failed (%s): %s", self.collection, e)
+            return _MISSING
+        data = snap.to_dict() if snap.exists else None
+        if not data or data.get("key") != key or data.get("expiresAt", 0) <= time.time():
+            self.misses += 1
+            return _MISSING
+        self.hits += 1
+        return data.get("value"), data["expiresAt"]
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        try:
+            self._doc(key).set({
+                "key": key,
+                "value": value,
+                "expiresAt": time.time() + (self.ttl if ttl is None else ttl),
+            })
+        except Exception as e:
+            self.errors += 1
+            logger.warning("cache store set failed (%s): %s", self.collection, e)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """여러 키를 get_all 한 번으로 조회 -> {key: (value, expiresAt)} (없거나 만료된 키는 결과에서 제외)"""
+        if not keys:
+            return {}
+        try:
+            snaps = list(self.db.get_all([self._doc(k) for k in keys]))
+        except Exception as e:
+            self.errors += 1
+            logger.warning("cache store get_many failed (%s): %s", self.collection, e)
+            return {}
+        now = time.time()
+        wanted = set(keys)
+        out = {}
+        for snap in snaps:
+            data = snap.to_dict() if snap.exists else None
+            if data and data.get("key") in wanted and data.get("expiresAt", 0) > now:
+                out[data["key"]] = (data.get("value"), data["expiresAt"])
+        self.hits += len(out)
+        self.misses += len(wanted) - len(out)
+        return out
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None):
+        if not items:
+            return
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        pairs = list(items.items())
+        try:
+            for i in range(0, len(pairs), 500):  # Firestore batch 당 최대 500 write
+                batch = self.db.batch()
+                for key, value in pairs[i:i + 500]:
+                    batch.set(self._doc(key), {"key": key, "value": value, "expiresAt": expires_at})
+                batch.commit()
+        except Exception as e:
+            self.errors += 1
+            logger.warning("cache store set_many failed (%s): %s", self.collection, e)
+
+    def stats(self) -> Dict:
+        return {"collection": self.collection, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+class TwoTierCache:
+    """L1(in-process LRU) → L2(영속 저장소) 순서로 조회하는 2단 캐시"""
+    def __init__(self, name: str, local: TTLLRUCache, store: Optional[FirestoreStore] = None):
+        self.name = name
+        self.local = local
+        self.store = store
+        CACHE_REGISTRY[name] = self
+
+    async def get(self, key: str, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.store is None:
+            return default
+        found = await asyncio.to_thread(self.store.get, key)
+        if found is _MISSING:
+            return default
+        value, expires_at = found
+        self._promote(key, value, expires_at)
+        return value
+
+    def _promote(self, key: str, value, expires_at: float):
+        """L2 hit 을 L1 으로 승격 - L2 에 남은 수명을 넘겨서 보관하지 않음 (짧은 TTL 음성 캐시 등)"""
+        remaining = expires_at - time.time()
+        if remaining > 0:
+            self.local.set(key, value, min(self.local.ttl, remaining))
+
+    async def set(self, key: str, value, ttl: Optional[float] = None):
+        self.local.set(key, value, ttl)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.set, key, value, ttl)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        out = {}
+        missing = []
+        for k in dict.fromkeys(keys):
+            value = self.local.get(k, _MISSING)
+            if value is _MISSING:
+                missing.append(k)
+            else:
+                out[k] = value
+        if missing and self.store is not None:
+            found = await asyncio.to_thread(self.store.get_many, missing)
+            for k, (value, expires_at) in found.items():
+                self._promote(k, value, expires_at)
+                out[k] = value
+        return out
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None):
+        for k, value in items.items():
+            self.local.set(k, value, ttl)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.set_many, items, ttl)
+
+    def stats(self) -> Dict:
+        out = {"local": self.local.stats()}
+        if self.store is not None:
+            out["persistent"] = self.store.stats()
+        return out
+
+def build_cache(name: str, *, maxsize: int, ttl: float, local_ttl: Optional[float] = None,
+                collection: Optional[str] = None) -> TwoTierCache:
+    """환경변수({NAME}_CACHE_MAXSIZE / _TTL / _LOCAL_TTL / _PERSIST)로 크기·TTL·영속 계층을 조정"""
+    prefix = name.upper()
+    maxsize = int(os.getenv(f"{prefix}_CACHE_MAXSIZE", maxsize))
+    ttl = float(os.getenv(f"{prefix}_CACHE_TTL", ttl))
+    local_ttl = float(os.getenv(f"{prefix}_CACHE_LOCAL_TTL", local_ttl if local_ttl is not None else ttl))
+    persist = os.getenv(f"{prefix}_CACHE_PERSIST", "firestore" if collection else "off").lower()
+    store = FirestoreStore(collection, ttl) if collection and persist == "firestore" else None
+    return TwoTierCache(name, TTLLRUCache(maxsize=maxsize, ttl=local_ttl), store)
+
+def cache_stats() -> Dict:
+    return {name: c.stats() for name, c in CACHE_REGISTRY.items()}
@@ -14,6 +14,21 @@ class MenuItemOut(BaseModel):
     cx: float
     cy: float
 
+# ---------- OCR Translate (여러 장) ----------
+class MultiMenuItemOut(MenuItemOut):
+    photo: int = Field(..., description="cx/cy 가 속한 사진 index (처음 나온 사진)")
+    photos: List[int] = Field(..., description="이 항목이 찍힌 사진 index 목록")
+
+class PhotoOCRResult(BaseModel):
+    index: int
+    words: int = 0
+    lang: Optional[str] = None
+    error: Optional[str] = None
+
+class MultiOCRTranslateResponse(BaseModel):
+    items: List[MultiMenuItemOut]
+    photos: List[PhotoOCRResult]
+
 # ---------- Analyze One ----------
 class AnalyzeOneRequest(BaseModel):
     source_language: str = Field(..., description="음식의 원산지에 대한 설명")
@@ -22,3 +37,10 @@ class AnalyzeOneRequest(BaseModel):
 
 class AnalyzeOneResponse(BaseModel):
     data: dict
+
+# ---------- Analyze Batch ----------
+class AnalyzeBatchRequest(BaseModel):
+    source_language: str = Field(..., description="음식의 원산지에 대한 설명")
+    target_language: str = Field(..., description="음식에 대한 분석을 target_lanugage로 작성")
+    food_names: List[str] = Field(..., min_length=1, max_length=100, description="ocr-translate 결과의 원어 text 목록")
+    pack_size: Optional[int] = Field(None, ge=1, le=10, description="Gemini 호출 1회에 묶을 음식 수")
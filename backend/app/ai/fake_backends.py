@@ -0,0 +1,267 @@
+# fake_backends.py
+"""오프라인 부하 테스트/벤치마크용 가짜 업스트림 (Gemini, Vision, 이미지 검색, Firebase Auth/Firestore).
+
+환경변수로 선택:
+- AI_BACKEND=fake                    : 모든 업스트림 fake (기본 real)
+- LLM_BACKEND / VISION_BACKEND / IMAGE_BACKEND / AUTH_BACKEND / DB_BACKEND : 업스트림별 개별 지정
+- FAKE_{LLM,VISION,IMAGE}_LATENCY_MS="median,p95" : 로그정규 지연 분포
+- FAKE_{LLM,VISION,IMAGE}_FAILURE_RATE=0.05      : 실패 확률
+- FAKE_SEED                                       : 결정적 난수 시드
+- FAKE_CALLS_MAX                                  : 입력별 호출 순번을 기억하는 최대 개수
+응답 모양은 실제 SDK 응답(candidates/parts, full_text_annotation)과 동일하게 맞춤.
+"""
+import os, re, json, math, uuid, random, asyncio, hashlib, time
+from collections import OrderedDict
+from types import SimpleNamespace as NS
+from typing import Dict, Optional
+
+FAKE_SEED = os.getenv("FAKE_SEED", "0")
+FAKE_CALLS_MAX = int(os.getenv("FAKE_CALLS_MAX", 10000))
+
+def backend_for(upstream: str) -> str:
+    return os.getenv(f"{upstream}_BACKEND", os.getenv("AI_BACKEND", "real")).lower()
+
+class FakeUpstreamError(Exception):
+    """fake 업스트림이 주입한 실패 (code 는 실제 API 에러처럼 429/503)"""
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+class _Profile:
+    """지연 분포 + 실패율. 같은 입력/호출 순번이면 같은 결과 (결정적)"""
+    def __init__(self, name: str, median_ms: float, p95_ms: float, failure_rate: float = 0.0):
+        raw = os.getenv(f"FAKE_{name}_LATENCY_MS")
+        if raw:
+            parts = [float(x) for x in raw.split(",")]
+            median_ms = parts[0]
+            p95_ms = parts[1] if len(parts) > 1 else parts[0]
+        self.name = name
+        self.mu = math.log(max(median_ms, 0.001))
+        self.sigma = max(0.0, (math.log(max(p95_ms, median_ms, 0.001)) - self.mu) / 1.645)
+        self.failure_rate = float(os.getenv(f"FAKE_{name}_FAILURE_RATE", failure_rate))
+        self._calls: "OrderedDict[str, int]" = OrderedDict()  # 장시간 부하 테스트에서도 크기 제한 (LRU)
+
+    def rng(self, content: str) -> random.Random:
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        n = self._calls.pop(digest, 0)
+        self._calls[digest] = n + 1
+        if len(self._calls) > FAKE_CALLS_MAX:
+            self._calls.popitem(last=False)
+        return random.Random(f"{FAKE_SEED}|{self.name}|{digest}|{n}")
+
+    def latency(self, rng: random.Random) -> float:
+        return rng.lognormvariate(self.mu, self.sigma) / 1000.0
+
+    def fails(self, rng: random.Random) -> bool:
+        return rng.random() < self.failure_rate
+
+# ---------- Gemini ----------
+_DISH_RE = re.compile(r'specific dish: "(.*?)"')
+_LANG_RE = re.compile(r"MUST be entirely in (\S+?)\.")
+_NOT_FOOD = {"beverage", "beverages", "dessert", "desserts", "special", "fresh", "menu", "drinks", "price"}
+
+def _fake_analysis(name: str, lang: str, rng: random.Random) -> Dict:
+    from app.ai.food_analyzer import ALLERGEN_ENUM, COUNTRY_ENUM
+    return {
+        "country": rng.choice(COUNTRY_ENUM),
+        "dishName": f"{name} ({lang})",
+        "ingredients": [f"{lang}-ingredient-{i}" for i in range(rng.randint(3, 5))],
+        "allergens": rng.sample(ALLERGEN_ENUM, rng.randint(0, 3)),
+        "summary": f"[{lang}] {name} is a traditional dish. It is commonly served in local restaurants.",
+        "recommendedFor": [f"[{lang}] first-time visitors"],
+        "originCulture": f"[{lang}] {name} has a long history. It reflects the regional food culture.",
+    }
+
+def _fake_llm_text(prompt: str, rng: random.Random) -> str:
+    lang_m = _LANG_RE.search(prompt)
+    lang = lang_m.group(1) if lang_m else "EN"
+    if "DISHES:" in prompt:
+        names = [l.strip()[2:] for l in prompt.split("DISHES:", 1)[1].strip().splitlines() if l.strip().startswith("- ")]
+        return json.dumps([{**_fake_analysis(n, lang, rng), "foodName": n} for n in names], ensure_ascii=False)
+    if "TOKENS:" in prompt:
+        lang_t = re.search(r'"translated": "<(\S+?) if', prompt)
+        lang = lang_t.group(1) if lang_t else lang
+        toks = [l.strip()[2:] for l in prompt.split("TOKENS:", 1)[1].strip().splitlines() if l.strip().startswith("- ")]
+        out = []
+        for t in toks:
+            is_food = len(t) > 2 and not re.fullmatch(r"[\d\W_]+", t) and t.lower() not in _NOT_FOOD
+            out.append({"text": t, "is_food": is_food, "translated": f"{t} ({lang})" if is_food else ""})
+        return json.dumps(out, ensure_ascii=False)
+    m = _DISH_RE.search(prompt)
+    return json.dumps(_fake_analysis(m.group(1) if m else "dish", lang, rng), ensure_ascii=False)
+
+def _genai_response(text: str, finish_reason: str = "STOP"):
+    part = NS(text=text)
+    return NS(candidates=[NS(content=NS(parts=[part]), finish_reason=finish_reason)], text=text)
+
+class _FakeModels:
+    def __init__(self, profile: _Profile):
+        self.profile = profile
+
+    async def generate_content(self, model: str, contents, config=None):
+        prompt = str(contents)
+        rng = self.profile.rng(prompt)
+        await asyncio.sleep(self.profile.latency(rng))
+        if self.profile.fails(rng):
+            raise FakeUpstreamError(rng.choice([429, 503]), "fake LLM failure")
+        return _genai_response(_fake_llm_text(prompt, rng))
+
+    async def generate_content_stream(self, model: str, contents, config=None):
+        prompt = str(contents)
+        rng = self.profile.rng(prompt)
+        total = self.profile.latency(rng)
+        ttfb = total * 0.2
+        await asyncio.sleep(ttfb)
+        if self.profile.fails(rng):
+            raise FakeUpstreamError(rng.choice([429, 503]), "fake LLM failure")
+        text = _fake_llm_text(prompt, rng)
+        chunks = [text[i:i + 24] for i in range(0, len(text), 24)] or [""]
+        step = (total - ttfb) / len(chunks)
+
+        async def gen():
+            for c in chunks:
+                await asyncio.sleep(step)
+                yield _genai_response(c)
+        return gen()
+
+class FakeGenAIClient:
+    """genai.Client 와 같은 client.aio.models.generate_content(_stream) 인터페이스"""
+    def __init__(self, median_ms: float = 1800, p95_ms: float = 4500, failure_rate: float = 0.0):
+        self.aio = NS(models=_FakeModels(_Profile("LLM", median_ms, p95_ms, failure_rate)))
+
+# ---------- Vision ----------
+FAKE_MENU = [
+    ("Paella Valenciana", "18.50"), ("Tortilla Española", "7.30"), ("Gazpacho Andaluz", "6.90"),
+    ("Patatas Bravas", "5.50"), ("Chistorra", "8.20"), ("Croquetas de Jamón", "9.00"),
+    ("Pulpo a la Gallega", "16.40"), ("Churros con Chocolate", "4.80"), ("Sangría", "5.00"),
+    ("Crema Catalana", "5.20"), ("Calamares Fritos", "10.50"), ("Pimientos de Padrón", "6.00"),
+]
+
+def _fake_word(text: str, x: float, y: float, h: float, lang: str):
+    w = max(1.0, h * 0.55) * max(1, len(text))
+    verts = [NS(x=int(x), y=int(y)), NS(x=int(x + w), y=int(y)),
+             NS(x=int(x + w), y=int(y + h)), NS(x=int(x), y=int(y + h))]
+    return NS(
+        symbols=[NS(text=ch) for ch in text],
+        bounding_box=NS(vertices=verts),
+        property=NS(detected_languages=[NS(language_code=lang, confidence=0.9)]),
+    ), w
+
+def _fake_annotation(rng: random.Random, lang: str = "es"):
+    words = []
+    lines = rng.randint(8, len(FAKE_MENU))
+    for i, (name, price) in enumerate(rng.sample(FAKE_MENU, lines)):
+        y = 120 + i * 70 + rng.uniform(-3, 3)
+        x = 80.0
+        for tok in name.split():
+            w, width = _fake_word(tok, x, y, 32, lang)
+            words.append(w)
+            x += width + 18
+        w, _ = _fake_word(price, 1500, y, 32, lang)
+        words.append(w)
+    return NS(pages=[NS(blocks=[NS(paragraphs=[NS(words=words)])])])
+
+class FakeVisionClient:
+    """vision.ImageAnnotatorClient.document_text_detection 과 같은 응답 모양"""
+    def __init__(self, median_ms: float = 900, p95_ms: float = 2500, failure_rate: float = 0.0):
+        self.profile = _Profile("VISION", median_ms, p95_ms, failure_rate)
+
+    def document_text_detection(self, image=None, **kwargs):
+        content = getattr(image, "content", b"") or b""
+        rng = self.profile.rng(hashlib.sha1(content).hexdigest())
+        time.sleep(self.profile.latency(rng))  # 실제 SDK 처럼 동기(블로킹) 호출
+        if self.profile.fails(rng):
+            return NS(error=NS(message="fake vision failure"), full_text_annotation=NS(pages=[]))
+        return NS(error=NS(message=""), full_text_annotation=_fake_annotation(rng))
+
+    def batch_annotate_images(self, requests=None, **kwargs):
+        responses = [self.document_text_detection(image=getattr(r, "image", None)) for r in (requests or [])]
+        return NS(responses=responses)
+
+# ---------- Image search ----------
+class FakeImageSearch:
+    """_crawl_dish_image_url 대체: 결정적 URL, 실패 비율만큼은 검색 오류(예외)"""
+    def __init__(self, median_ms: float = 1200, p95_ms: float = 3500, failure_rate: float = 0.05):
+        self.profile = _Profile("IMAGE", median_ms, p95_ms, failure_rate)
+
+    async def fetch(self, dish_name: str, country_hint: Optional[str] = None) -> str:
+        key = f"{dish_name}|{country_hint or ''}"
+        rng = self.profile.rng(key)
+        await asyncio.sleep(self.profile.latency(rng))
+        if self.profile.fails(rng):
+            raise RuntimeError("fake image search failure")
+        slug = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return f"https://images.fake.local/dishes/{slug}.jpg"
+
+# ---------- Firebase Auth / Firestore ----------
+class FakeAuth:
+    """firebase_admin.auth.verify_id_token 대체: 비어 있지 않은 토큰이면 통과 (토큰별 고정 uid)"""
+    def verify_id_token(self, id_token: str, check_revoked: bool = False) -> Dict:
+        if not id_token:
+            raise ValueError("empty id token")
+        uid = "bench-" + hashlib.sha1(id_token.encode("utf-8")).hexdigest()[:12]
+        return {"uid": uid, "email": f"{uid}@bench.local", "name": uid, "email_verified": True}
+
+class _NoopSnapshot:
+    def __init__(self, ref):
+        self.reference = ref
+        self.id = ref.id
+        self.exists = False
+
+    def to_dict(self):
+        return None
+
+class _NoopRef:
+    """컬렉션/문서/쿼리 참조 - 쓰기는 버리고 읽기는 항상 비어 있음"""
+    def __init__(self, path: str, query: bool = False):
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+        self._query = query
+
+    def collection(self, name: str):
+        return _NoopRef(f"{self.path}/{name}" if self.path else name)
+
+    def document(self, doc_id: Optional[str] = None):
+        return _NoopRef(f"{self.path}/{doc_id or uuid.uuid4().hex}")
+
+    def where(self, *args, **kwargs):
+        return _NoopRef(self.path, query=True)
+
+    limit = order_by = offset = where
+
+    def stream(self):
+        return iter(())
+
+    def get(self, *args, **kwargs):
+        return [] if self._query else _NoopSnapshot(self)
+
+    def add(self, data, document_id: Optional[str] = None):
+        return time.time(), self.document(document_id)
+
+    def set(self, *args, **kwargs):
+        pass
+
+    update = delete = set
+
+class _NoopBatch:
+    def __init__(self):
+        self._mutations = []
+
+    def set(self, ref, *args, **kwargs):
+        self._mutations.append(ref)
+
+    update = delete = set
+
+    def commit(self):
+        self._mutations = []
+
+class FakeFirestore(_NoopRef):
+    """firestore.client() 대체: 프로필은 빈 값, 캐시 L2/검색 로그 쓰기는 버림 (L1 캐시만 동작)"""
+    def __init__(self):
+        super().__init__("")
+
+    def batch(self):
+        return _NoopBatch()
+
+    def get_all(self, refs, *args, **kwargs):
+        return (_NoopSnapshot(r) for r in refs)
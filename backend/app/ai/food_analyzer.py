@@ -3,15 +3,19 @@ from typing import Dict, List
 from dotenv import load_dotenv
 import firebase_admin
 from firebase_admin import credentials, firestore
-from google import genai
 from app.ai.dto import AnalyzeOneRequest
 from app.ai.image_fetcher import fetch_dish_image_url_async
+from app.ai.cache import build_cache, stable_hash
+from app.ai.text_utils import normalize_text
+from app.ai.single_flight import SingleFlight
+from app.ai.json_stream import JSONFieldStream
+from app.ai.llm_gateway import llm, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from app.ai.fake_backends import backend_for, FakeFirestore
 from app.models.food import FoodInfo
 from app.models.search import SimpleSearchResponse
 
 load_dotenv()
 MAX_TOKENS = 1700
-GENAI_API_KEY = os.getenv("GOOGLE_API_KEY")
 SERVICE_ACCOUNT = os.getenv("FIREBASE_CREDENTIALS")
 MODEL_NAME = "gemini-2.5-flash" # "gemini-1.5-pro", "gemini-2.0-pro-exp", "gemini-2.5-flash"
 COUNTRY_ENUM = ['CN', 'ES', 'FR', 'IT', 'JP', 'KR', 'MX', 'TH', 'US', 'VN']
@@ -20,14 +24,30 @@ ALLERGEN_ENUM = [
     'PEANUT','PINE_NUT','PORK','SHELLFISH','SHRIMP','SOY','SQUID',
     'SULFITES','TOMATO','WALNUT','WHEAT'
 ]
+# dietary_codes 컬렉션의 restrictedFoods 와 동일 (setup_firestore.py 참고)
+DIETARY_RESTRICTED = {
+    'HINDUISM': ['BEEF'],
+    'ISLAM': ['PORK'],
+    'VEGAN': ['EGG','BEEF','PORK','CHICKEN','SHRIMP','CRAB','SQUID','MACKEREL','SHELLFISH','MILK'],
+    'VEGETARIAN': ['BEEF','PORK','CHICKEN'],
+}
+# shared: 음식/언어별 공용 분석 + 사용자별 판정은 로컬 계산, personalized: 사용자 제약을 프롬프트에 포함
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "shared")
 
 logger = logging.getLogger(__name__)
-if not firebase_admin._apps:
-    cred = credentials.Certificate(SERVICE_ACCOUNT)
-    firebase_admin.initialize_app(cred)
+if backend_for("DB") == "fake":  # 오프라인 벤치마크용 (Firebase 초기화 안 함)
+    db = FakeFirestore()
+else:
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(SERVICE_ACCOUNT)
+        firebase_admin.initialize_app(cred)
+    db = firestore.client()
 
-db = firestore.client()
-client = genai.Client(api_key=GENAI_API_KEY)
+# 분석 결과 캐시: L1 in-process LRU(1h) + L2 Firestore(analysis_cache, 7d)
+analysis_cache = build_cache("analysis", maxsize=2048, ttl=7 * 24 * 3600, local_ttl=3600,
+                             collection="analysis_cache")
+# 같은 음식/언어 동시 요청은 Gemini + 이미지 크롤링을 1번만 수행
+analysis_flight = SingleFlight("analysis")
 
 # User의 profile읽어오기 
 def get_user_profile(uid: str) -> Dict:
@@ -41,10 +61,15 @@ def extract_user_constraints(user_profile: Dict) -> Dict:
     religion = ", ".join(diet) if isinstance(diet, list) else (diet or None)
     return {"allergies": allergies, "religion": religion}
 
-def build_prompt(*, food_name: str, country_hint: str | None,
-                 target_lang_code: str, allergies: List[str], religion: str | None) -> str:
+def build_prompt(*, food_name: str, country_hint: str | None, target_lang_code: str,
+                 allergies: List[str] | None = None, religion: str | None = None,
+                 personalized: bool = True) -> str:
     country_enum = ", ".join(COUNTRY_ENUM)
     allergen_enum = ", ".join(ALLERGEN_ENUM)
+    user_block = f"""
+    User constraints:
+    - allergies: {", ".join(allergies) if allergies else "none"}
+    - religion/diet: {religion or "none"}""" if personalized else ""
 
     return f"""
     You are analyzing information about a specific dish: "{food_name}".
@@ -64,10 +89,7 @@ def build_prompt(*, food_name: str, country_hint: str | None,
     "recommendedFor": ["{target_lang_code} ..."],
     "originCulture": "<{target_lang_code} 2 sentences>"
     }}
-
-    User constraints:
-    - allergies: {", ".join(allergies) if allergies else "none"}
-    - religion/diet: {religion or "none"}
+    {user_block}
     Country constraints:
     - This dish is likely from {country_hint} (cuisine_country_code).
     - This dish is NOT from {target_lang_code} (cuisine_country_code).
@@ -81,15 +103,21 @@ def safe_load_json(text: str) -> Dict:
             t = t[4:].strip()
     return json.loads(t)
 
+ANALYSIS_FIELDS = [
+    "country","dishName","ingredients","allergens",
+    "summary","recommendedFor","originCulture"
+]
+
 def validate_and_normalize(obj: Dict) -> Dict:
-    required = [
-        "country","dishName","ingredients","allergens",
-        "summary","recommendedFor","originCulture"
-    ]
-    for k in required:
+    for k in ANALYSIS_FIELDS:
         if k not in obj:
             raise ValueError(f"Missing key: {k}") # 빠진 키가 있는지 
+    for k in ANALYSIS_FIELDS:
+        obj[k] = normalize_field(k, obj.get(k))
+    return obj
 
+# 필드 단위 정리 (스트리밍에서 필드가 완성될 때마다 동일 규칙 적용)
+def normalize_field(key: str, value):
     to_str = lambda v: "" if v is None else str(v).strip()
     def uniq(xs): return list(dict.fromkeys(xs))
     def str_list(v):
@@ -97,27 +125,56 @@ def validate_and_normalize(obj: Dict) -> Dict:
         return uniq([to_str(x) for x in v if to_str(x)])
 
     # 문자열 필드 정리
-    obj["dishName"] = to_str(obj.get("dishName"))
-    obj["summary"] = to_str(obj.get("summary"))
-    obj["originCulture"] = to_str(obj.get("originCulture"))
+    if key in ("dishName", "summary", "originCulture"):
+        return to_str(value)
     # 배열 필드 정리
-    obj["ingredients"] = str_list(obj.get("ingredients"))
-    obj["recommendedFor"] = str_list(obj.get("recommendedFor"))
-
+    if key in ("ingredients", "recommendedFor"):
+        return str_list(value)
     # country 제약
-    raw_country = to_str(obj.get("country"))
-    obj["country"] = raw_country if raw_country in COUNTRY_ENUM else ""
-
+    if key == "country":
+        raw_country = to_str(value)
+        return raw_country if raw_country in COUNTRY_ENUM else ""
     # allergens 제약(대소문자/복수형 보정 → 카논 상수로 매핑)
-    canon = {v.lower(): v for v in ALLERGEN_ENUM}
-    def norm_allergen(a: str):
-        lower = a.strip().lower()
-        if lower.endswith("s") and lower[:-1] in canon:
-            lower = lower[:-1]
-        return canon.get(lower)
-    raws = str_list(obj.get("allergens"))
-    obj["allergens"] = [x for x in uniq([norm_allergen(a) for a in raws]) if x]
-    return obj
+    if key == "allergens":
+        raws = str_list(value)
+        return [x for x in uniq([norm_allergen(a) for a in raws]) if x]
+    return value
+
+_ALLERGEN_CANON = {v.lower(): v for v in ALLERGEN_ENUM}
+def norm_allergen(a: str):
+    lower = str(a).strip().lower().replace(" ", "_")
+    if lower.endswith("s") and lower[:-1] in _ALLERGEN_CANON:
+        lower = lower[:-1]
+    return _ALLERGEN_CANON.get(lower)
+
+# 공용 분석 결과 + 사용자 프로필 → 알러지 충돌/식단 경고를 로컬에서 계산 (LLM 호출 없음)
+def personalize(data: Dict, cons: Dict) -> Dict:
+    allergens = set(data.get("allergens") or [])
+    user_allergies = [x for x in (norm_allergen(a) for a in cons.get("allergies") or []) if x]
+    conflicts = [a for a in dict.fromkeys(user_allergies) if a in allergens]
+
+    diets = [d.strip().upper() for d in (cons.get("religion") or "").split(",") if d.strip()]
+    warnings = []
+    for diet in dict.fromkeys(diets):
+        hit = [a for a in DIETARY_RESTRICTED.get(diet, []) if a in allergens]
+        if hit:
+            warnings.append({"diet": diet, "allergens": hit})
+    return {**data, "allergenConflicts": conflicts, "dietWarnings": warnings}
+
+def _response_text(resp) -> str:
+    if resp.candidates and resp.candidates[0].content.parts:
+        part = resp.candidates[0].content.parts[0]
+        return getattr(part, "text", "") or getattr(part, "inline_data", {}).get("data", "")
+    return ""
+
+def _finish_reason(resp) -> str:  # fallback: finish_reason 확인 메시지
+    return getattr(resp.candidates[0], "finish_reason", "UNKNOWN") if resp.candidates else "NO_CANDIDATE"
+
+def _parse_json(text: str):
+    try:
+        return json.loads(text)
+    except Exception:
+        return safe_load_json(text) # 모델이 fence를 넣었거나 잡다한 문구가 끼면 기존 안전 파서 사용
 
 # 동기함수 로직 스레드로 off-load
 async def _to_thread(fn, *args, **kwargs):
@@ -130,9 +187,49 @@ async def timed_task(coro, label):
     print(f"{label} took {elapsed:.3f} sec")
     return result
 
+# 캐시 키 = 정규화된 음식명 + 언어쌍 + 사용자 제약 지문 (shared 모드는 모든 사용자가 같은 키)
+def analysis_cache_key(cons: Dict, req: AnalyzeOneRequest, shared: bool = False) -> str:
+    fingerprint = "shared" if shared else stable_hash(
+        {"allergies": sorted(cons.get("allergies") or []), "religion": cons.get("religion")})
+    return "|".join([
+        normalize_text(req.food_name),
+        (req.source_language or "").strip().upper(),
+        (req.target_language or "").strip().upper(),
+        fingerprint,
+    ])
+
 async def analyze_one_async(
-    cons: Dict, req: AnalyzeOneRequest,
+    cons: Dict, req: AnalyzeOneRequest, use_cache: bool = True, shared: bool | None = None,
+    priority: int = PRIORITY_INTERACTIVE,
 ) -> Dict:
+    if shared is None:
+        shared = ANALYSIS_MODE == "shared"
+    llm_cons = {} if shared else cons
+
+    key = analysis_cache_key(cons, req, shared=shared)
+    if not use_cache:
+        data = await analysis_flight.do(
+            ("nocache", key), lambda: _analyze_uncached(llm_cons, req, personalized=not shared, priority=priority))
+        return data if "error" in data else personalize(data, cons)
+
+    cached = await analysis_cache.get(key)
+    if cached is not None:
+        logging.info("analysis cache hit: %s", key)
+        return personalize({**cached, "foodName": req.food_name}, cons)
+
+    async def fill():
+        data = await _analyze_uncached(llm_cons, req, personalized=not shared, priority=priority)
+        if "error" not in data:  # 빈 응답/에러는 캐시하지 않음
+            await analysis_cache.set(key, data)
+        return data
+
+    data = await analysis_flight.do(key, fill)
+    if "error" in data:
+        return data
+    return personalize({**data, "foodName": req.food_name}, cons)
+
+async def _analyze_uncached(cons: Dict, req: AnalyzeOneRequest, personalized: bool = True,
+                            priority: int = PRIORITY_INTERACTIVE) -> Dict:
     item = req.food_name # 음식명 
     logging.info('item : %s',item)
 
@@ -142,6 +239,7 @@ async def analyze_one_async(
         target_lang_code= req.target_language,
         allergies=cons.get("allergies", []),
         religion=cons.get("religion"),
+        personalized=personalized,
     )
 
     # t0 = time.time()
@@ -160,32 +258,25 @@ async def analyze_one_async(
     )
     llm_task = asyncio.create_task(
         timed_task(
-            client.aio.models.generate_content(
-                model=MODEL_NAME,
-                contents=prompt,
-                config={
+            llm.generate(
+                prompt,
+                {
                     "temperature": 0.4,
                     "max_output_tokens": MAX_TOKENS,
                     "response_mime_type": "application/json",
                 },
+                model=MODEL_NAME, priority=priority, caller="analyze",
             ),
             "LLM call"
         )
     )
     resp, first_img_url = await asyncio.gather(llm_task, img_task)
 
-    text = ""
-    if resp.candidates and resp.candidates[0].content.parts:
-        part = resp.candidates[0].content.parts[0]
-        text = getattr(part, "text", "") or getattr(part, "inline_data", {}).get("data", "")
+    text = _response_text(resp)
     if not text:
-        fr = getattr(resp.candidates[0], "finish_reason", "UNKNOWN") if resp.candidates else "NO_CANDIDATE"  # fallback: finish_reason 확인 메시지
-        return {"foodName": item, "error": f"empty response (finish_reason={fr})"}
+        return {"foodName": item, "error": f"empty response (finish_reason={_finish_reason(resp)})"}
 
-    try:
-        raw = json.loads(text)
-    except Exception:
-        raw = safe_load_json(text) # 모델이 fence를 넣었거나 잡다한 문구가 끼면 기존 안전 파서 사용
+    raw = _parse_json(text)
     data = validate_and_normalize(raw)
 
     # t1 = time.time()
@@ -195,3 +286,256 @@ async def analyze_one_async(
     image_source = 'Crawling' if first_img_url is not None else 'None'
     return {"foodName": item, "url": first_img_url, "imgSrc" : image_source, **data}
 
+# ---------- Batch ----------
+BATCH_PACK_SIZE = int(os.getenv("ANALYZE_BATCH_PACK_SIZE", 5))       # 프롬프트 1개에 담을 음식 수
+BATCH_LLM_CONCURRENCY = int(os.getenv("ANALYZE_BATCH_LLM_CONCURRENCY", 4))
+BATCH_IMAGE_CONCURRENCY = int(os.getenv("ANALYZE_BATCH_IMAGE_CONCURRENCY", 8))
+BATCH_MAX_TOKENS = 8192
+
+def build_batch_prompt(*, food_names: List[str], country_hint: str | None, target_lang_code: str,
+                       allergies: List[str] | None = None, religion: str | None = None,
+                       personalized: bool = False) -> str:
+    country_enum = ", ".join(COUNTRY_ENUM)
+    allergen_enum = ", ".join(ALLERGEN_ENUM)
+    bullets = "\n".join(f"- {n}" for n in food_names)
+    user_block = f"""
+    User constraints (apply to every dish):
+    - allergies: {", ".join(allergies) if allergies else "none"}
+    - religion/diet: {religion or "none"}""" if personalized else ""
+
+    return f"""
+    You are analyzing {len(food_names)} dishes listed under DISHES. Analyze each dish independently.
+    Respond ONLY with a JSON ARRAY that conforms to the schema below. Do NOT include code fences.
+    Array rules (STRICT):
+    - Exactly one object per dish, in the SAME ORDER as DISHES.
+    - "foodName" MUST be the dish name EXACTLY as given in DISHES.
+    Language rules (STRICT):
+    - The "country" field MUST be in English only (choose from: {country_enum}). If unknown, use "".
+    - The "allergens" array MUST be in English only, using only canonical values from: {allergen_enum}. If unknown, use [].
+    - All other fields (dishName, ingredients, summary, recommendedFor, originCulture) MUST be entirely in {target_lang_code}.
+    - Never mix languages inside a single field.
+    Schema (each array element):
+    {{
+    "foodName": "<DISH exactly as given>",
+    "country": "<{country_enum}> or \"\"",
+    "dishName": "<{target_lang_code}>",
+    "ingredients": ["{target_lang_code} 3~5 words"],
+    "allergens": ["{allergen_enum}"],
+    "summary": "<{target_lang_code} 2 sentences>",
+    "recommendedFor": ["{target_lang_code} ..."],
+    "originCulture": "<{target_lang_code} 2 sentences>"
+    }}
+    {user_block}
+    Country constraints:
+    - These dishes are likely from {country_hint} (cuisine_country_code).
+    - These dishes are NOT from {target_lang_code} (cuisine_country_code).
+    DISHES:
+    {bullets}
+    """.strip()
+
+async def _analyze_pack(names: List[str], source_language: str, target_language: str,
+                        cons: Dict | None = None, personalized: bool = False) -> Dict[str, Dict]:
+    cons = cons or {}
+    prompt = build_batch_prompt(food_names=names, country_hint=source_language, target_lang_code=target_language,
+                                allergies=cons.get("allergies", []), religion=cons.get("religion"),
+                                personalized=personalized)
+    resp = await timed_task(
+        llm.generate(
+            prompt,
+            {
+                "temperature": 0.4,
+                "max_output_tokens": min(BATCH_MAX_TOKENS, MAX_TOKENS * len(names)),
+                "response_mime_type": "application/json",
+            },
+            model=MODEL_NAME, priority=PRIORITY_BATCH, caller="analyze_batch",
+        ),
+        f"LLM batch call ({len(names)})"
+    )
+    text = _response_text(resp)
+    if not text:
+        raise RuntimeError(f"empty response (finish_reason={_finish_reason(resp)})")
+    raw = _parse_json(text)
+    if not isinstance(raw, list):
+        raise ValueError("batch response is not a JSON array")
+
+    # foodName 으로 매칭 (같은 위치의 foodName 이 일치하면 그 항목 우선) - 밀린 응답을 다른 음식 캐시에 넣지 않도록
+    items = [o for o in raw if isinstance(o, dict)]
+    by_name = {}
+    for o in items:
+        by_name.setdefault(normalize_text(str(o.get("foodName", ""))), o)
+    out = {}
+    for i, name in enumerate(names):
+        key = normalize_text(name)
+        o = items[i] if i < len(items) and normalize_text(str(items[i].get("foodName", ""))) == key else by_name.get(key)
+        if o is None:
+            continue
+        try:
+            o.pop("foodName", None)
+            out[name] = validate_and_normalize(o)
+        except ValueError as e:
+            logger.warning("batch item %s invalid: %s", name, e)
+    return out
+
+async def analyze_batch_async(
+    cons: Dict, source_language: str, target_language: str, food_names: List[str],
+    pack_size: int = BATCH_PACK_SIZE, shared: bool | None = None,
+):
+    """여러 음식을 pack_size 개씩 묶어 Gemini 호출 수를 줄이고, 끝나는 순서대로 yield
+    (ANALYSIS_MODE=personalized 면 analyze_one_async 처럼 사용자 제약을 프롬프트/캐시 키에 반영)"""
+    if shared is None:
+        shared = ANALYSIS_MODE == "shared"
+    llm_cons = {} if shared else cons
+    names = list(dict.fromkeys(n.strip() for n in food_names if n and n.strip()))
+    reqs = {n: AnalyzeOneRequest(source_language=source_language, target_language=target_language, food_name=n)
+            for n in names}
+
+    keys = {n: analysis_cache_key(cons, reqs[n], shared=shared) for n in names}
+    found = await analysis_cache.get_many(list(keys.values()))  # L2 조회는 get_all 한 번
+    misses = []
+    for n in names:  # 캐시 hit 은 바로 내보냄
+        cached = found.get(keys[n])
+        if cached is not None:
+            yield personalize({**cached, "foodName": n}, cons)
+        else:
+            misses.append(n)
+    if not misses:
+        return
+
+    llm_sem = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+    img_sem = asyncio.Semaphore(BATCH_IMAGE_CONCURRENCY)
+
+    async def run_pack(pack):
+        async with llm_sem:
+            return await _analyze_pack(pack, source_language, target_language, llm_cons, personalized=not shared)
+
+    async def run_image(name):
+        async with img_sem:
+            return await fetch_dish_image_url_async(name, source_language)
+
+    packs = [misses[i:i + max(1, pack_size)] for i in range(0, len(misses), max(1, pack_size))]
+    pack_tasks = {}
+    for pack in packs:
+        t = asyncio.create_task(run_pack(pack))
+        for n in pack:
+            pack_tasks[n] = t
+    img_tasks = {n: asyncio.create_task(run_image(n)) for n in misses}
+    fresh = {}  # 끝난 결과는 모아서 set_many 한 번으로 저장
+
+    async def finish(name):
+        try:
+            results = await asyncio.shield(pack_tasks[name])
+        except Exception as e:
+            return {"foodName": name, "error": f"batch analysis failed: {e}"}
+        data = results.get(name)
+        if data is None:
+            return {"foodName": name, "error": "missing in batch response"}
+        try:
+            url = await img_tasks[name]
+        except Exception:
+            url = None
+        data = {"foodName": name, "url": url, "imgSrc": 'Crawling' if url is not None else 'None', **data}
+        fresh[keys[name]] = data
+        return personalize(data, cons)
+
+    item_tasks = [asyncio.create_task(finish(n)) for n in misses]
+    try:
+        for fut in asyncio.as_completed(item_tasks):
+            yield await fut
+    finally:  # 클라이언트가 끊기면 남은 작업 정리 (그때까지 끝난 결과는 저장)
+        if fresh:
+            await analysis_cache.set_many(fresh)
+        pending = [t for t in [*item_tasks, *set(pack_tasks.values()), *img_tasks.values()] if not t.done()]
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+# ---------- Stream ----------
+async def analyze_stream_async(cons: Dict, req: AnalyzeOneRequest, shared: bool | None = None):
+    """Gemini 스트리밍 응답에서 필드가 완성될 때마다 이벤트를 yield.
+
+    이벤트: {"event": "field", "data": {"name", "value"}} / {"event": "image", "data": {"url", "imgSrc"}}
+           {"event": "done", "data": <analyze_one_async 와 같은 결과>} / {"event": "error", "data": {...}}
+    """
+    if shared is None:
+        shared = ANALYSIS_MODE == "shared"
+    item = req.food_name
+    key = analysis_cache_key(cons, req, shared=shared)
+
+    cached = await analysis_cache.get(key)
+    if cached is not None:  # 캐시 hit 은 모든 필드를 바로 내보냄
+        for k in ANALYSIS_FIELDS:
+            yield {"event": "field", "data": {"name": k, "value": cached.get(k)}}
+        yield {"event": "image", "data": {"url": cached.get("url"), "imgSrc": cached.get("imgSrc")}}
+        yield {"event": "done", "data": personalize({**cached, "foodName": item}, cons)}
+        return
+
+    prompt = build_prompt(
+        food_name=item,
+        country_hint=req.source_language,
+        target_lang_code=req.target_language,
+        allergies=cons.get("allergies", []),
+        religion=cons.get("religion"),
+        personalized=not shared,
+    )
+    queue: asyncio.Queue = asyncio.Queue()
+    parser = JSONFieldStream()
+
+    async def pump_llm():
+        stream = llm.generate_stream(
+            prompt,
+            {
+                "temperature": 0.4,
+                "max_output_tokens": MAX_TOKENS,
+                "response_mime_type": "application/json",
+            },
+            model=MODEL_NAME, priority=PRIORITY_INTERACTIVE, caller="analyze_stream",
+        )
+        async for chunk in stream:
+            for k, v in parser.feed(getattr(chunk, "text", None) or ""):
+                if k in ANALYSIS_FIELDS:
+                    await queue.put({"event": "field", "data": {"name": k, "value": normalize_field(k, v)}})
+
+    async def pump_image():
+        try:
+            url = await fetch_dish_image_url_async(item, req.source_language)
+        except Exception as e:
+            logger.warning("image fetch failed: %s", e)
+            url = None
+        await queue.put({"event": "image", "data": {"url": url, "imgSrc": 'Crawling' if url is not None else 'None'}})
+        return url
+
+    llm_task = asyncio.create_task(pump_llm())
+    img_task = asyncio.create_task(pump_image())
+    tasks = [llm_task, img_task]
+    try:
+        while not (all(t.done() for t in tasks) and queue.empty()):
+            getter = asyncio.create_task(queue.get())
+            await asyncio.wait([getter, *[t for t in tasks if not t.done()]], return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+            if llm_task.done() and llm_task.exception() is not None:
+                raise llm_task.exception()
+
+        try:
+            first_img_url = img_task.result()
+        except Exception:
+            first_img_url = None
+        text = parser.text()
+        if not text.strip():
+            yield {"event": "error", "data": {"foodName": item, "error": "empty response"}}
+            return
+        data = validate_and_normalize(_parse_json(text))
+        data = {"foodName": item, "url": first_img_url,
+                "imgSrc": 'Crawling' if first_img_url is not None else 'None', **data}
+        await analysis_cache.set(key, data)
+        yield {"event": "done", "data": personalize(data, cons)}
+    except Exception as e:
+        logger.exception("analyze stream failed: %s", e)
+        yield {"event": "error", "data": {"foodName": item, "error": str(e)}}
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,101 @@
+# http_pool.py
+import os, asyncio, logging
+from typing import Dict, Optional
+import aiohttp
+import httpx
+
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", 100))              # 전체 동시 커넥션 상한
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", 10))         # 호스트당 커넥션 상한 (aiohttp 만 강제, httpx 는 keep-alive 수에만 사용)
+HTTP_KEEPALIVE_SEC = float(os.getenv("HTTP_KEEPALIVE_SEC", 30))
+HTTP_DNS_CACHE_SEC = int(os.getenv("HTTP_DNS_CACHE_SEC", 300))
+
+logger = logging.getLogger(__name__)
+
+class HTTPPools:
+    """앱 수명 동안 공유하는 HTTP 커넥션 풀 (FastAPI lifespan 에서 start/close)
+
+    - image: aiohttp 세션 (Bing 검색, 이미지 URL 검증) - 전체/호스트당 커넥션 상한
+    - download: httpx 클라이언트 (image_url 입력 다운로드) - 전체 상한만 (httpx Limits 에는 호스트당 상한이 없음)
+    lifespan 밖(스크립트 등)에서 호출되면 처음 사용할 때 생성
+    지표는 라이브러리 내부 필드 대신 공개 훅(aiohttp TraceConfig, httpx event_hooks)으로 직접 셈
+    """
+    def __init__(self):
+        self._image: Optional[aiohttp.ClientSession] = None
+        self._download: Optional[httpx.AsyncClient] = None
+        self._lock = asyncio.Lock()
+        self.image_in_flight = 0
+        self.image_requests = 0
+        self.download_requests = 0
+
+    def _image_trace(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_start(session, ctx, params):
+            self.image_in_flight += 1
+            self.image_requests += 1
+
+        async def on_end(session, ctx, params):  # 응답 헤더 수신(또는 실패) 시점
+            self.image_in_flight -= 1
+
+        trace.on_request_start.append(on_start)
+        trace.on_request_end.append(on_end)
+        trace.on_request_exception.append(on_end)
+        return trace
+
+    async def _on_download(self, request):
+        self.download_requests += 1
+
+    async def start(self):
+        await self.image_session()
+        self.download_client()
+
+    async def close(self):
+        if self._image is not None and not self._image.closed:
+            await self._image.close()
+        if self._download is not None:
+            await self._download.aclose()
+        self._image = None
+        self._download = None
+
+    async def image_session(self) -> aiohttp.ClientSession:
+        if self._image is None or self._image.closed:
+            async with self._lock:
+                if self._image is None or self._image.closed:
+                    connector = aiohttp.TCPConnector(
+                        ssl=False,
+                        limit=HTTP_POOL_LIMIT,
+                        limit_per_host=HTTP_POOL_PER_HOST,
+                        use_dns_cache=True,
+                        ttl_dns_cache=HTTP_DNS_CACHE_SEC,
+                        keepalive_timeout=HTTP_KEEPALIVE_SEC,
+                    )
+                    self._image = aiohttp.ClientSession(
+                        timeout=aiohttp.ClientTimeout(total=10), connector=connector,
+                        trace_configs=[self._image_trace()])
+        return self._image
+
+    def download_client(self) -> httpx.AsyncClient:
+        if self._download is None:
+            self._download = httpx.AsyncClient(
+                timeout=15,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_LIMIT,
+                    max_keepalive_connections=HTTP_POOL_PER_HOST * 2,
+                    keepalive_expiry=HTTP_KEEPALIVE_SEC,
+                ),
+                event_hooks={"request": [self._on_download]},
+            )
+        return self._download
+
+    def stats(self) -> Dict:
+        out = {"limit": HTTP_POOL_LIMIT, "limitPerHost": HTTP_POOL_PER_HOST}
+        if self._image is not None and not self._image.closed:
+            out["image"] = {"inFlight": self.image_in_flight, "requests": self.image_requests,
+                            "utilization": round(self.image_in_flight / HTTP_POOL_LIMIT, 4) if HTTP_POOL_LIMIT else 0.0}
+        if self._download is not None:
+            out["download"] = {"requests": self.download_requests, "limitPerHost": None}
+        return out
+
+# 전역 인스턴스
+http_pools = HTTPPools()
@@ -1,16 +1,36 @@
 # image_fetcher.py
-import re, time, random, asyncio, os
+import re, time, random, asyncio, os, logging, codecs
+import html as html_lib
 from typing import List, Optional, Iterable, Set
 from urllib.parse import urlencode, urlparse
 from dotenv import load_dotenv
 import aiohttp 
 # request(동) 쓰지 않고 aiohttp(비동기)
 from bs4 import BeautifulSoup
+from app.ai.fake_backends import backend_for, FakeImageSearch
+from app.ai.http_pool import http_pools
+from app.ai.cache import build_cache
+from app.ai.text_utils import normalize_text
 
 load_dotenv()
 
 _UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36"
 UNSPLASH_ACCESS_KEY=os.getenv('UNSPLASH_ACCESS_KEY')
+_FAKE = FakeImageSearch() if backend_for("IMAGE") == "fake" else None  # 오프라인 벤치마크용
+
+logger = logging.getLogger(__name__)
+
+# (음식명, 국가) -> 검증된 이미지 URL. 못 찾은 결과("")는 짧은 TTL 로 캐시
+IMAGE_NEGATIVE_TTL = float(os.getenv("IMAGE_NEGATIVE_TTL", 6 * 3600))
+IMAGE_REVALIDATE_AFTER = float(os.getenv("IMAGE_REVALIDATE_AFTER", 24 * 3600))  # 이보다 오래된 URL 은 백그라운드 재검증
+image_cache = build_cache("image", maxsize=5000, ttl=14 * 24 * 3600, local_ttl=24 * 3600,
+                          collection="image_cache")
+_revalidating: dict = {}            # key -> Task (중복 재검증 방지, 참조 유지)
+_revalidate_sem = asyncio.Semaphore(4)
+
+class ImageSearchError(Exception):
+    """검색 자체가 실패 (타임아웃/차단 등) - '찾아봤지만 없음' 과 구분해 negative 캐시하지 않음"""
+    pass
 
 def _h() -> dict:
     return {"User-Agent": _UA, "Accept-Language": "en-US,en;q=0.9"}
@@ -42,36 +62,94 @@ def _looks_like_real_image(u: str) -> bool:
     return True
 
 # --- 이미지 URL 검증 ---
+# 요청 간 공유하는 URL -> {ok, contentType, checkedAt} 캐시 (인기 음식은 같은 CDN URL 반복)
+# 성공 TTL 은 URL_CHECK_CACHE_TTL (build_cache 공통 knob, 기본 6h), 실패는 짧게
+URL_CHECK_NEGATIVE_TTL = float(os.getenv("URL_CHECK_NEGATIVE_TTL", 30 * 60))
+url_check_cache = build_cache("url_check", maxsize=20000, ttl=6 * 3600)
+
 async def _is_image(session, u, timeout_sec=8.0):
+    cached = await url_check_cache.get(u)
+    if cached is not None:
+        return cached["ok"]
+    ok, ct = await _probe_image(session, u, timeout_sec)
+    await url_check_cache.set(u, {"ok": ok, "contentType": ct, "checkedAt": time.time()},
+                              ttl=None if ok else URL_CHECK_NEGATIVE_TTL)
+    return ok
+
+async def _probe_image(session, u, timeout_sec=8.0):
     timeout = aiohttp.ClientTimeout(total=timeout_sec)
     try:
         async with session.head(u, headers=_h(), allow_redirects=True, timeout=timeout) as r:
             ct = r.headers.get("content-type", "")
             if r.status == 200 and ct.startswith("image/"):
-                return True
+                return True, ct
     except:
         pass
+    # HEAD 미지원 서버: 앞 512바이트만 Range 요청, 본문은 읽지 않고 헤더만 보고 닫음
     try:
-        async with session.get(u, headers=_h(), allow_redirects=True, timeout=timeout) as r:
+        headers = {**_h(), "Range": "bytes=0-511"}
+        async with session.get(u, headers=headers, allow_redirects=True, timeout=timeout) as r:
             ct = r.headers.get("content-type", "")
-            return r.status == 200 and ct.startswith("image/")
+            ok = r.status in (200, 206) and ct.startswith("image/")
+            r.close()  # 남은 본문을 내려받지 않도록 커넥션 종료
+            return ok, ct
     except:
-        return False
+        return False, ""
 
 
 # --- Bing 이미지 후보 수집 (murl만) ---
 _MURL_RE = re.compile(r'"murl":"(.*?)"')
-async def _bing_images(session: aiohttp.ClientSession, q: str, limit: int = 6) -> List[str]:
-    url = "https://www.bing.com/images/search?" + urlencode({"q": q})
-    try:
-        async with session.get(url, headers=_h(), timeout=aiohttp.ClientTimeout(total=8)) as resp:
-            html = await resp.text()
-    except Exception:
-        return []
+# 원본 HTML 에서 바로 murl 추출: m="{&quot;murl&quot;:&quot;https://...&quot;,...}"
+# 값 안의 &amp; 등은 허용, 닫는 따옴표(" 또는 &quot;)가 버퍼에 들어와야 매칭됨 (청크 경계 안전)
+_MURL_SCAN_RE = re.compile(r'(?:"|&quot;)murl(?:"|&quot;)\s*:\s*(?:"|&quot;)((?:[^"&<>\s]|&(?!quot;))+?)(?:"|&quot;)')
+BING_STREAM_CHUNK = int(os.getenv("BING_STREAM_CHUNK", 16 * 1024))
+BING_MAX_BYTES = int(os.getenv("BING_MAX_BYTES", 2 * 1024 * 1024))   # 페이지를 이 이상은 읽지 않음
+_SCAN_TAIL = 4096                                                   # 청크 경계에 걸친 매칭용으로 남기는 꼬리
 
-    soup = BeautifulSoup(html, "html.parser")
-    out: Set[str] = set()
+def _clean_murl(raw: str) -> str:
+    return html_lib.unescape(raw).replace("\\u002f", "/").replace("\\", "")
 
+def _keep_candidate(u: str) -> bool:
+    return not _is_blocked(u) and _looks_like_real_image(u)
+
+class MurlScanner:
+    """HTML 을 조각 단위로 받아 murl 후보를 순서대로 뽑음 (파싱 트리 없이 정규식 스캔)"""
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.found: List[str] = []
+        self._seen: Set[str] = set()
+        self._buf = ""
+
+    @property
+    def full(self) -> bool:
+        return len(self.found) >= self.limit
+
+    def feed(self, text: str) -> bool:
+        """조각 추가, limit 개가 모이면 True"""
+        buf = self._buf + text
+        end = 0
+        for m in _MURL_SCAN_RE.finditer(buf):
+            end = m.end()
+            u = _clean_murl(m.group(1))
+            if u in self._seen:
+                continue
+            self._seen.add(u)
+            if _keep_candidate(u):
+                self.found.append(u)
+                if self.full:
+                    break
+        self._buf = buf[max(end, len(buf) - _SCAN_TAIL):]
+        return self.full
+
+def extract_murls(html: str, limit: int = 6) -> List[str]:
+    scanner = MurlScanner(limit)
+    scanner.feed(html)
+    return scanner.found
+
+def extract_murls_soup(html: str, limit: int = 6) -> List[str]:
+    """이전 방식 (BeautifulSoup 전체 파싱) - 벤치마크 비교용"""
+    soup = BeautifulSoup(html, "html.parser")
+    out: List[str] = []
     for a in soup.select("a.iusc"):
         raw = a.get("m") or a.get("data-m")
         if not raw:
@@ -79,10 +157,34 @@ async def _bing_images(session: aiohttp.ClientSession, q: str, limit: int = 6) -
         m = _MURL_RE.search(raw)
         if m:
             u = m.group(1).replace("\\u002f", "/").replace("\\", "")
-            out.add(u)
+            if u not in out:
+                out.append(u)
+    return [u for u in out if _keep_candidate(u)][:limit]
 
-    cand = [u for u in out if not _is_blocked(u) and _looks_like_real_image(u)]
-    return cand[:limit]
+async def _bing_images(session: aiohttp.ClientSession, q: str, limit: int = 6) -> List[str]:
+    url = "https://www.bing.com/images/search?" + urlencode({"q": q})
+    scanner = MurlScanner(limit)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    read = 0
+    try:
+        async with session.get(url, headers=_h(), timeout=aiohttp.ClientTimeout(total=8)) as resp:
+            if resp.status != 200:
+                raise ImageSearchError(f"bing status {resp.status}")
+            # 받는 대로 스캔하고, 후보가 limit 개 모이면 나머지 본문은 읽지 않고 닫음
+            async for chunk in resp.content.iter_chunked(BING_STREAM_CHUNK):
+                read += len(chunk)
+                if scanner.feed(decoder.decode(chunk)) or read >= BING_MAX_BYTES:
+                    resp.close()
+                    break
+            else:
+                scanner.feed(decoder.decode(b"", final=True))
+    except ImageSearchError:
+        raise
+    except Exception as e:
+        if not scanner.found:
+            raise ImageSearchError(f"bing search failed: {e!r}") from e
+        # 타임아웃/끊김이어도 그때까지 모은 후보는 사용
+    return scanner.found
 
 # --- 첫 유효 이미지 즉시 반환 ---
 async def _first_ok(session: aiohttp.ClientSession, urls: Iterable[str], concurrency: int = 10) -> str:
@@ -131,26 +233,186 @@ async def _unsplash_images(session: aiohttp.ClientSession, q: str, per_page: int
             out.append(u)
     return out
 
+def _image_key(dish_name: str, country_hint: str = None) -> str:
+    return f"{normalize_text(dish_name)}|{(country_hint or '').strip().upper()}"
+
 async def fetch_dish_image_url_async(dish_name: str, country_hint: str=None, per_query_limit=6, validate_concurrency=12) -> str:
-    queries = [dish_name]
-    if country_hint:
-        queries.insert(0, f"{dish_name} {country_hint}")
-    queries += [f"{dish_name} dish", f"{dish_name} food"]
-
-    async with aiohttp.ClientSession(
-        timeout=aiohttp.ClientTimeout(total=10),
-        connector=aiohttp.TCPConnector(ssl=False, limit=0),
-    ) as session:
-        bing_tasks = [asyncio.create_task(_bing_images(session, q, limit=per_query_limit)) for q in queries] #  Bing 검색 병렬 실행
-        results = await asyncio.gather(*bing_tasks)
-        all_urls = []
-        seen = set()
-        for urls in results:
-            for u in urls:
-                if u not in seen:
-                    seen.add(u)
-                    all_urls.append(u)
-        return await _first_ok(session, all_urls, concurrency=validate_concurrency)
+    key = _image_key(dish_name, country_hint)
+    cached = await image_cache.get(key)
+    if cached is not None:
+        if time.time() - cached.get("checkedAt", 0) > IMAGE_REVALIDATE_AFTER:
+            _schedule_revalidate(key, cached.get("url", ""), dish_name, country_hint)
+        return cached.get("url", "")
+
+    try:
+        url = await _crawl_dish_image_url(dish_name, country_hint, per_query_limit, validate_concurrency)
+    except Exception as e:  # 검색 오류는 캐시하지 않음 (다음 요청에서 다시 시도)
+        logger.warning("image search failed %s: %s", key, e)
+        return ""
+    await _store(key, url)
+    return url
+
+async def _store(key: str, url: str):
+    await image_cache.set(key, {"url": url, "checkedAt": time.time()},
+                          ttl=None if url else IMAGE_NEGATIVE_TTL)
+
+def _schedule_revalidate(key: str, url: str, dish_name: str, country_hint: str = None):
+    if key in _revalidating:
+        return
+    task = asyncio.create_task(_revalidate(key, url, dish_name, country_hint))
+    _revalidating[key] = task
+    task.add_done_callback(lambda t: _revalidating.pop(key, None))
+
+# 요청 경로 밖에서 오래된 URL 재확인: 살아있으면 checkedAt 갱신, 죽었으면 재크롤링으로 교체
+async def _revalidate(key: str, url: str, dish_name: str, country_hint: str = None):
+    async with _revalidate_sem:
+        try:
+            if url and _FAKE is None:
+                session = await http_pools.image_session()
+                if await _is_image(session, url):
+                    await _store(key, url)
+                    return
+            new_url = await _crawl_dish_image_url(dish_name, country_hint)
+            await _store(key, new_url)
+            logger.info("image revalidated %s: %s -> %s", key, url, new_url)
+        except Exception as e:
+            logger.warning("image revalidate failed %s: %s", key, e)
+
+# 쿼리 모양 (우선순위 순). country 가 없으면 name_country 는 건너뜀
+_QUERY_SHAPES = [
+    ("name_country", "{name} {country}"),
+    ("name", "{name}"),
+    ("name_dish", "{name} dish"),
+    ("name_food", "{name} food"),
+]
+IMAGE_SEARCH_MODE = os.getenv("IMAGE_SEARCH_MODE", "pipelined")    # pipelined | gather
+IMAGE_QUERY_FANOUT = int(os.getenv("IMAGE_QUERY_FANOUT", 2))       # 동시에 미리 날리는 쿼리 수
+IMAGE_SHAPE_MIN_SAMPLES = int(os.getenv("IMAGE_SHAPE_MIN_SAMPLES", 200))
+IMAGE_SHAPE_MIN_HIT_RATE = float(os.getenv("IMAGE_SHAPE_MIN_HIT_RATE", 0.02))
+IMAGE_SHAPE_EXPLORE = float(os.getenv("IMAGE_SHAPE_EXPLORE", 0.05))     # 꺼진 모양도 이 확률로는 보냄 (회복 확인용)
+IMAGE_SHAPE_WINDOW = int(os.getenv("IMAGE_SHAPE_WINDOW", 1000))         # 이만큼 쌓이면 awaited/hits 를 절반으로 (오래된 성적 감쇠)
+
+class _ShapeStats:
+    """쿼리 모양별 성적: 결과를 기다린 횟수 대비 유효 이미지를 낸 비율(상위 쿼리 실패 시 조건부)"""
+    def __init__(self):
+        self.data = {name: {"issued": 0, "awaited": 0, "hits": 0, "candidates": 0, "latency": 0.0}
+                     for name, _ in _QUERY_SHAPES}
+
+    def hit_rate(self, shape: str) -> float:
+        d = self.data[shape]
+        return d["hits"] / d["awaited"] if d["awaited"] else 1.0
+
+    def enabled(self, shape: str) -> bool:
+        d = self.data[shape]
+        return d["awaited"] < IMAGE_SHAPE_MIN_SAMPLES or self.hit_rate(shape) >= IMAGE_SHAPE_MIN_HIT_RATE
+
+    def worth_sending(self, shape: str, index: int) -> bool:
+        if index == 0:  # 최우선 쿼리는 항상 보냄
+            return True
+        # 성적이 나빠 꺼진 모양도 가끔은 보내야 일시적인 문제였는지 다시 확인할 수 있음
+        return self.enabled(shape) or random.random() < IMAGE_SHAPE_EXPLORE
+
+    def record(self, shape: str, hit: bool):
+        d = self.data[shape]
+        d["awaited"] += 1
+        if hit:
+            d["hits"] += 1
+        if d["awaited"] >= IMAGE_SHAPE_WINDOW:  # 지수 감쇠: 최근 결과 비중을 유지
+            d["awaited"] //= 2
+            d["hits"] //= 2
+
+    def stats(self) -> dict:
+        return {name: {**d, "latency": round(d["latency"] / d["issued"], 4) if d["issued"] else 0.0,
+                       "hitRate": round(self.hit_rate(name), 4), "enabled": self.enabled(name)}
+                for name, d in self.data.items()}
+
+shape_stats = _ShapeStats()
+
+def _build_queries(dish_name: str, country_hint: str = None) -> List[tuple]:
+    out = []
+    for shape, fmt in _QUERY_SHAPES:
+        if "{country}" in fmt and not country_hint:
+            continue
+        out.append((shape, fmt.format(name=dish_name, country=country_hint)))
+    return out
+
+def image_query_stats() -> dict:
+    return {"mode": IMAGE_SEARCH_MODE, "shapes": shape_stats.stats()}
+
+async def _crawl_dish_image_url(dish_name: str, country_hint: str=None, per_query_limit=6, validate_concurrency=12) -> str:
+    """찾은 URL, 모든 검색이 정상 완료됐는데 없으면 "", 검색이 실패해 판단할 수 없으면 ImageSearchError"""
+    if _FAKE is not None:
+        return await _FAKE.fetch(dish_name, country_hint)
+    session = await http_pools.image_session()  # 앱 수명 동안 공유하는 keep-alive 풀
+    if IMAGE_SEARCH_MODE == "gather":
+        return await _crawl_gather(session, dish_name, country_hint, per_query_limit, validate_concurrency)
+    return await _crawl_pipelined(session, dish_name, country_hint, per_query_limit, validate_concurrency)
+
+# 검색 결과가 오는 대로 검증 시작, 우선순위 순으로 채택, 찾으면 나머지 쿼리 취소
+async def _crawl_pipelined(session, dish_name: str, country_hint: str, per_query_limit: int, validate_concurrency: int) -> str:
+    queries = [(shape, q) for i, (shape, q) in enumerate(_build_queries(dish_name, country_hint))
+               if shape_stats.worth_sending(shape, i)]
+    seen: Set[str] = set()
+    errors = []
+
+    async def search_and_validate(shape: str, q: str) -> str:
+        t0 = time.time()
+        urls = await _bing_images(session, q, limit=per_query_limit)
+        shape_stats.data[shape]["latency"] += time.time() - t0
+        fresh = [u for u in urls if u not in seen]  # 먼저 도착한 쿼리가 검증 중인 URL 제외
+        seen.update(fresh)
+        shape_stats.data[shape]["candidates"] += len(fresh)
+        if not fresh:
+            return ""
+        return await _first_ok(session, fresh, concurrency=validate_concurrency)
+
+    tasks = {}
+    def issue(k: int):
+        if k < len(queries) and k not in tasks:
+            shape, q = queries[k]
+            shape_stats.data[shape]["issued"] += 1
+            tasks[k] = asyncio.create_task(search_and_validate(shape, q))
+
+    try:
+        for k in range(len(queries)):
+            for j in range(k, k + max(1, IMAGE_QUERY_FANOUT)):  # 현재 + 다음 (fanout-1)개만 미리 발행
+                issue(j)
+            shape = queries[k][0]
+            try:
+                url = await tasks[k]
+            except Exception as e:
+                errors.append(e)
+                url = ""
+            shape_stats.record(shape, bool(url))
+            if url:
+                return url
+        if errors:
+            raise ImageSearchError(f"{len(errors)}/{len(queries)} searches failed: {errors[0]}")
+        return ""
+    finally:
+        pending = [t for t in tasks.values() if not t.done()]
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+async def _crawl_gather(session, dish_name: str, country_hint: str, per_query_limit: int, validate_concurrency: int) -> str:
+    queries = [q for _, q in _build_queries(dish_name, country_hint)]
+    bing_tasks = [asyncio.create_task(_bing_images(session, q, limit=per_query_limit)) for q in queries] #  Bing 검색 병렬 실행
+    results = await asyncio.gather(*bing_tasks, return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    all_urls = []
+    seen = set()
+    for urls in results:
+        if isinstance(urls, Exception):
+            continue
+        for u in urls:
+            if u not in seen:
+                seen.add(u)
+                all_urls.append(u)
+    url = await _first_ok(session, all_urls, concurrency=validate_concurrency)
+    if not url and errors:
+        raise ImageSearchError(f"{len(errors)}/{len(queries)} searches failed: {errors[0]}")
+    return url
 
     # async with aiohttp.ClientSession(
     #     timeout=aiohttp.ClientTimeout(total=12),
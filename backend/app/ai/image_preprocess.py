@@ -1,14 +1,111 @@
 # image_preprocess.py
+import os
+import math
+import time
+import struct
 from io import BytesIO
 import cv2
 import numpy as np
 from PIL import Image, ImageOps
 
-#  EXIF 정보를 읽어서 이미지 자체를 올바른 방향으로 변환
+#  EXIF 정보를 읽어서 이미지 자체를 올바른 방향으로 변환 (PIL 경로 - OpenCV 가 못 읽는 포맷/벤치마크 비교용)
 def _read_with_orientation(img):
-    img = ImageOps.exif_transpose(img)
+    img = ImageOps.exif_transpose(img).convert("RGB")
     return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
 
+# ---------- 복사 없는 디코드: 업로드 버퍼 -> OpenCV 배열 ----------
+EXIF_ORIENTATION_TAG = 0x0112
+
+def _tiff_orientation(tiff) -> int:
+    """TIFF(EXIF) 블록의 IFD0 에서 Orientation 태그만 읽음. 없거나 깨졌으면 1"""
+    if len(tiff) < 8:
+        return 1
+    order = bytes(tiff[:2])
+    if order == b"II":
+        e = "<"
+    elif order == b"MM":
+        e = ">"
+    else:
+        return 1
+    ifd = struct.unpack_from(e + "I", tiff, 4)[0]
+    if ifd + 2 > len(tiff):
+        return 1
+    count = struct.unpack_from(e + "H", tiff, ifd)[0]
+    for i in range(count):
+        off = ifd + 2 + 12 * i
+        if off + 12 > len(tiff):
+            break
+        if struct.unpack_from(e + "H", tiff, off)[0] == EXIF_ORIENTATION_TAG:
+            v = struct.unpack_from(e + "H", tiff, off + 8)[0]
+            return v if 1 <= v <= 8 else 1
+    return 1
+
+def exif_orientation(buf) -> int:
+    """JPEG APP1 / PNG eXIf 에서 방향 값(1~8)만 추출. 이미지 데이터(SOS/IDAT)에 닿으면 중단"""
+    mv = memoryview(buf)
+    n = len(mv)
+    if n >= 4 and mv[0] == 0xFF and mv[1] == 0xD8:  # JPEG
+        pos = 2
+        while pos + 4 <= n:
+            if mv[pos] != 0xFF:
+                break
+            marker = mv[pos + 1]
+            if marker == 0xFF:  # 채움 바이트
+                pos += 1
+                continue
+            if marker == 0xD8 or 0xD0 <= marker <= 0xD7:
+                pos += 2
+                continue
+            if marker in (0xDA, 0xD9):  # SOS / EOI: 이후는 압축 데이터
+                break
+            seg = struct.unpack_from(">H", mv, pos + 2)[0]
+            if marker == 0xE1 and bytes(mv[pos + 4:pos + 10]) == b"Exif\x00\x00":
+                return _tiff_orientation(mv[pos + 10:pos + 2 + seg])
+            pos += 2 + seg
+    elif bytes(mv[:8]) == b"\x89PNG\r\n\x1a\n":
+        pos = 8
+        while pos + 8 <= n:
+            length, ctype = struct.unpack_from(">I4s", mv, pos)
+            if ctype == b"eXIf":
+                return _tiff_orientation(mv[pos + 8:pos + 8 + length])
+            if ctype in (b"IDAT", b"IEND"):
+                break
+            pos += 12 + length
+    return 1
+
+def apply_orientation(img, orientation: int):
+    """EXIF 방향 값 -> cv2.rotate/flip/transpose (ImageOps.exif_transpose 와 같은 결과)"""
+    if orientation == 2:
+        return cv2.flip(img, 1)
+    if orientation == 3:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(img, 0)
+    if orientation == 5:
+        return cv2.transpose(img)
+    if orientation == 6:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(img), -1)
+    if orientation == 8:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+def decode_image(input_data):
+    """bytes/bytearray/memoryview 또는 경로 -> BGR ndarray
+
+    업로드 버퍼를 memoryview 로 감싸 그대로 cv2.imdecode 에 넘김 (BytesIO/PIL/np.array 중간 사본 없음)
+    방향은 EXIF Orientation 태그만 읽어 회전/뒤집기로 적용. OpenCV 가 못 읽는 포맷이면 PIL 로 대체
+    """
+    if not isinstance(input_data, (bytes, bytearray, memoryview)):
+        with open(str(input_data), "rb") as f:
+            input_data = f.read()
+    arr = np.frombuffer(memoryview(input_data), dtype=np.uint8)
+    img = cv2.imdecode(arr, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if img is None:
+        return _read_with_orientation(Image.open(BytesIO(input_data)))
+    return apply_orientation(img, exif_orientation(input_data))
+
 # 4개의 점 정렬 
 def _order_points(pts):
     rect = np.zeros((4, 2), dtype="float32")
@@ -37,28 +134,57 @@ def _four_point_transform(image, pts):
     warped = cv2.warpPerspective(image, M, (maxW, maxH), flags=cv2.INTER_CUBIC)
     return warped
 
-# 문서/메뉴판 외곽 4각형 추정 실패하면 None리턴 
-def _detect_document_quad(img): 
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+# 외곽 검출은 긴 변 QUAD_DETECT_LONG 이하의 축소본에서 하고 꼭짓점만 원본 좌표로 환산
+QUAD_DETECT_LONG = 800
+QUAD_MIN_AREA_RATIO = 0.7
+
+def _find_quad(gray, min_area_ratio=QUAD_MIN_AREA_RATIO):
     gray = cv2.GaussianBlur(gray, (5,5), 0)
     edges = cv2.Canny(gray, 50, 150)
     edges = cv2.dilate(edges, np.ones((3,3), np.uint8), iterations=1)
 
     h_img, w_img = gray.shape[:2]
-    img_area = w_img * h_img
+    min_area = min_area_ratio * w_img * h_img
+
+    # 빠른 탈출: 엣지 전체의 외접 사각형조차 기준 면적보다 작으면 큰 윤곽이 있을 수 없음
+    pts = cv2.findNonZero(edges)
+    if pts is None:
+        return None
+    _, _, bw, bh = cv2.boundingRect(pts)
+    if bw * bh < min_area:
+        return None
 
     cnts, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-    cnts = sorted(cnts, key=cv2.contourArea, reverse=True)[:10]
-    for c in cnts:
-        area = cv2.contourArea(c)
-        if area < 0.7 * img_area:  # 너무 작은건 무시
-            continue
+    big = [(a, c) for c in cnts if (a := cv2.contourArea(c)) >= min_area]  # 큰 것만 남긴 뒤 정렬
+    big.sort(key=lambda x: x[0], reverse=True)
+    for _, c in big[:10]:
         peri = cv2.arcLength(c, True)
         approx = cv2.approxPolyDP(c, 0.02 * peri, True)
         if len(approx) == 4:
             return approx.reshape(4, 2).astype("float32")
     return None
 
+# 문서/메뉴판 외곽 4각형 추정 실패하면 None리턴 
+def _detect_document_quad(img, detect_long=QUAD_DETECT_LONG):
+    h, w = img.shape[:2]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)  # 축소 전에 1채널로 (리사이즈 비용 1/3)
+    k = math.ceil(max(h, w) / detect_long)  # 정수 배율: INTER_AREA 가 블록 평균 빠른 경로를 탐
+    if k <= 1:
+        return _find_quad(gray)
+    small = cv2.resize(gray, (max(1, w // k), max(1, h // k)), interpolation=cv2.INTER_AREA)
+    quad = _find_quad(small)
+    if quad is None:
+        return None
+    # 축소본 픽셀 중심 -> 원본 좌표
+    sx, sy = w / small.shape[1], h / small.shape[0]
+    quad[:, 0] = np.clip((quad[:, 0] + 0.5) * sx - 0.5, 0, w - 1)
+    quad[:, 1] = np.clip((quad[:, 1] + 0.5) * sy - 0.5, 0, h - 1)
+    return quad
+
+def _detect_document_quad_fullres(img):
+    """이전 방식 (원본 해상도에서 검출) - 벤치마크 비교용"""
+    return _find_quad(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+
 def resize_for_vision(img, target_long=2000):
     h, w = img.shape[:2]
     long = max(h, w)
@@ -67,19 +193,94 @@ def resize_for_vision(img, target_long=2000):
     interp = cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA
     return cv2.resize(img, (new_w, new_h), interpolation=interp)
 
-def preprocess_image(input_data, rectify=True):
-    if isinstance(input_data, (bytes, bytearray)):
-        pil = Image.open(BytesIO(input_data))
-    else:
-        pil = Image.open(str(input_data))
-
-    src = _read_with_orientation(pil)
+def preprocess_image(input_data, rectify=True, resize=True):
+    src = decode_image(input_data)
     quad = _detect_document_quad(src) if rectify else None
     if quad is not None:
         src = _four_point_transform(src, quad)
-    src = resize_for_vision(src)
+    if resize:
+        src = resize_for_vision(src)
     return src
 
+# ---------- Vision 업로드용 적응형 해상도/인코딩 ----------
+VISION_ENCODE_FORMAT = os.getenv("VISION_ENCODE_FORMAT", "jpeg").lower()  # jpeg | webp | png
+VISION_MAX_LONG = int(os.getenv("VISION_MAX_LONG", 2000))       # 긴 변 상한 (이전 고정값)
+VISION_MIN_LONG = int(os.getenv("VISION_MIN_LONG", 1024))       # 글자가 커도 이 이하로는 줄이지 않음
+VISION_TARGET_TEXT_PX = float(os.getenv("VISION_TARGET_TEXT_PX", 28))  # 이보다 큰 글자는 줄여도 인식에 지장 없음
+VISION_MIN_TEXT_PX = float(os.getenv("VISION_MIN_TEXT_PX", 14))        # 이보다 작으면 이 높이까지만 확대
+VISION_QUALITY = int(os.getenv("VISION_QUALITY", 85))
+VISION_QUALITY_SMALL_TEXT = int(os.getenv("VISION_QUALITY_SMALL_TEXT", 92))  # 작은 글자는 압축 손실에 민감
+VISION_LAYOUT_LONG = 2000  # 단어 좌표 기준 공간 (이전 resize_for_vision 고정 크기) - 라인 묶기 임계값과 클라이언트 cx/cy 가 이 스케일 기준
+
+def estimate_text_height(img, probe_long=1000):
+    """글자 높이(px, 원본 기준) 추정: 축소본 이진화 후 연결요소 높이의 중앙값. 못 찾으면 None"""
+    h, w = img.shape[:2]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    k = max(1, math.ceil(max(h, w) / probe_long))
+    small = cv2.resize(gray, (max(1, w // k), max(1, h // k)), interpolation=cv2.INTER_AREA) if k > 1 else gray
+    bw = cv2.adaptiveThreshold(small, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(bw, connectivity=8)
+    hs, ws, areas = stats[1:, cv2.CC_STAT_HEIGHT], stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_AREA]
+    keep = (hs >= 3) & (areas >= 6) & (hs <= small.shape[0] * 0.1) & (ws <= small.shape[1] * 0.3)
+    if keep.sum() < 20:  # 글자라고 볼 만한 요소가 너무 적음
+        return None
+    return float(np.median(hs[keep])) * h / small.shape[0]
+
+def plan_vision_scale(shape, text_h):
+    """긴 변 상한 안에서: 글자가 크면 목표 높이까지 축소, 작으면 최소 높이까지만 확대"""
+    long = max(shape[:2])
+    cap = VISION_MAX_LONG / long
+    scale = min(1.0, cap)
+    if text_h:
+        if text_h * scale > VISION_TARGET_TEXT_PX:
+            scale = max(VISION_TARGET_TEXT_PX / text_h, min(1.0, VISION_MIN_LONG / long))
+        elif text_h * scale < VISION_MIN_TEXT_PX:
+            scale = max(scale, min(VISION_MIN_TEXT_PX / text_h, cap))
+    return scale
+
+def encode_for_vision(img, fmt=None):
+    """적응형 리사이즈 + 인코드. (bytes, info) - info 에 포맷/품질/크기/인코딩 시간 기록"""
+    fmt = (fmt or VISION_ENCODE_FORMAT).lower()
+    text_h = estimate_text_height(img)
+    scale = plan_vision_scale(img.shape, text_h)
+    if abs(scale - 1.0) > 1e-3:
+        h, w = img.shape[:2]
+        interp = cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA
+        img = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=interp)
+    text_px = text_h * scale if text_h else None
+    quality = VISION_QUALITY_SMALL_TEXT if text_px is not None and text_px < 20 else VISION_QUALITY
+
+    t0 = time.time()
+    if fmt == "webp":
+        ok, buf = cv2.imencode(".webp", img, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    elif fmt == "png":
+        ok, buf = cv2.imencode(".png", img)
+        quality = None
+    else:
+        fmt = "jpeg"
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError(f"Failed to encode image to {fmt}")
+    data = buf.tobytes()
+    return data, {"format": fmt, "quality": quality, "width": img.shape[1], "height": img.shape[0],
+                  "textPx": round(text_px, 1) if text_px else None, "bytes": len(data),
+                  "encode": time.time() - t0}
+
+# ---------- 프로세스 풀 워커 (ocr_service 에서 사용) ----------
+def init_worker(cv_threads: int = 1):
+    """워커 프로세스 초기화: 워커 수 x OpenCV 내부 스레드가 코어를 과점하지 않도록 제한"""
+    cv2.setNumThreads(cv_threads)
+
+def preprocess_and_encode(image_bytes: bytes, rectify=True):
+    """전처리 + Vision 용 적응형 인코드. (bytes, 단계별 시간/인코딩/좌표 배율 정보) 반환 - 워커 프로세스에서 실행"""
+    started = time.time()
+    img = preprocess_image(image_bytes, rectify=rectify, resize=False)  # np.ndarray (BGR)
+    t1 = time.time()
+    data, info = encode_for_vision(img)
+    # Vision 응답 좌표 x coordScale = 긴 변 VISION_LAYOUT_LONG 기준 좌표 (보낸 해상도와 무관하게 고정)
+    info["coordScale"] = VISION_LAYOUT_LONG / max(info["width"], info["height"])
+    return data, {**info, "startedAt": started, "preprocess": t1 - started, "encode": time.time() - t1}
+
 # =========Test Code=========
 # disp = preprocess_image('./image.png')
 # scale = 0.4  # 절반 크기
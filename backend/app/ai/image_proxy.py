@@ -0,0 +1,313 @@
+# image_proxy.py
+"""음식 이미지 썸네일 프록시 (/api/images/{id})
+
+- FoodInfo.imageUrl 의 외부 URL 을 proxy_url() 로 /api/images/{id} 로 바꿔서 내려줌
+- id = base64url(원본 URL) + "." + HMAC 서명 -> 디스크 상태 없이 id 만으로 원본 URL 복원
+  (재시작/재배포/다른 레플리카에서도 이미 내려준 imageUrl 이 계속 유효, 서명으로 임의 URL 프록시 방지)
+- 처음 요청 시 원본을 한 번만 받아 표준 너비(IMAGE_PROXY_WIDTHS)로 줄여 디스크에 저장 (로컬 캐시일 뿐)
+- IMAGE_PROXY_SECRET / 절대 IMAGE_PROXY_BASE_URL 이 없으면 꺼짐 (원본 URL 을 그대로 내려줌)
+- 공인 IP 호스트만 가져옴 (리다이렉트마다 다시 확인) - 내부망/메타데이터 서버 SSRF 방지
+- 디스크는 IMAGE_PROXY_MAX_AGE_DAYS / IMAGE_PROXY_MAX_MB 를 넘으면 오래된 것부터 정리
+- 저장 경로는 원본 바이트의 sha256 (같은 이미지를 가리키는 URL 끼리 파일 공유)
+    {IMAGE_PROXY_DIR}/refs/{sha1(url)}.json  : {"url", "content"}  (content = 원본 sha256)
+    {IMAGE_PROXY_DIR}/blobs/{content}/{w}.jpg
+"""
+import os, io, hmac, json, time, shutil, socket, base64, asyncio, hashlib, logging, tempfile, ipaddress
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from PIL import Image, ImageOps
+from app.ai.http_pool import http_pools
+from app.ai.single_flight import SingleFlight
+
+IMAGE_PROXY_DIR = os.getenv("IMAGE_PROXY_DIR", "/tmp/dish_images")
+# 클라이언트/저장된 음식 기록이 그대로 로드하므로 반드시 절대 URL (예: https://api.example.com)
+IMAGE_PROXY_BASE_URL = os.getenv("IMAGE_PROXY_BASE_URL", "").rstrip("/")
+IMAGE_PROXY_WIDTHS = sorted(int(w) for w in os.getenv("IMAGE_PROXY_WIDTHS", "160,480,960").split(","))
+IMAGE_PROXY_DEFAULT_WIDTH = int(os.getenv("IMAGE_PROXY_DEFAULT_WIDTH", 480))
+IMAGE_PROXY_WORKERS = int(os.getenv("IMAGE_PROXY_WORKERS", 2))
+IMAGE_PROXY_MAX_BYTES = int(os.getenv("IMAGE_PROXY_MAX_BYTES", 10 * 1024 * 1024))
+IMAGE_PROXY_QUALITY = int(os.getenv("IMAGE_PROXY_QUALITY", 82))
+IMAGE_PROXY_MAX_REDIRECTS = int(os.getenv("IMAGE_PROXY_MAX_REDIRECTS", 3))
+IMAGE_PROXY_MAX_MB = int(os.getenv("IMAGE_PROXY_MAX_MB", 1024))             # 디스크 캐시 상한
+IMAGE_PROXY_MAX_AGE_DAYS = float(os.getenv("IMAGE_PROXY_MAX_AGE_DAYS", 30))  # 마지막 사용 후 보관 기간
+IMAGE_PROXY_SWEEP_SEC = int(os.getenv("IMAGE_PROXY_SWEEP_SEC", 600))        # 정리 주기 (저장 시점에 확인)
+# 모든 레플리카가 같은 값을 써야 함 (바꾸면 이전에 내려준 imageUrl 은 404)
+IMAGE_PROXY_SECRET = os.getenv("IMAGE_PROXY_SECRET", "")
+
+logger = logging.getLogger(__name__)
+
+def _enabled() -> bool:
+    if os.getenv("IMAGE_PROXY", "on").lower() != "on":
+        return False
+    if not IMAGE_PROXY_SECRET:
+        logger.warning("IMAGE_PROXY_SECRET is not set; image proxy disabled")
+        return False
+    if not IMAGE_PROXY_BASE_URL.startswith(("http://", "https://")):
+        logger.warning("IMAGE_PROXY_BASE_URL must be an absolute URL; image proxy disabled")
+        return False
+    return True
+
+IMAGE_PROXY = _enabled()  # 조건이 하나라도 빠지면 꺼짐 (공개 키 서명 / 상대경로 imageUrl 방지)
+_SECRET = IMAGE_PROXY_SECRET.encode("utf-8")
+
+# 리사이즈는 CPU 작업이라 전용 워커 풀에서 (이벤트 루프/기본 스레드풀과 분리)
+_executor = ThreadPoolExecutor(max_workers=IMAGE_PROXY_WORKERS, thread_name_prefix="image-proxy")
+proxy_flight = SingleFlight("image_proxy")
+
+class ImageProxyError(Exception):
+    pass
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+def _sign(raw: bytes) -> str:
+    return _b64(hmac.new(_SECRET, raw, hashlib.sha256).digest()[:16])
+
+def url_id(url: str) -> str:
+    """원본 URL -> 프록시 id (base64url URL + "." + 서명)"""
+    raw = url.encode("utf-8")
+    return f"{_b64(raw)}.{_sign(raw)}"
+
+def decode_id(uid: str) -> Optional[str]:
+    """프록시 id -> 원본 URL. 형식/서명이 맞지 않으면 None"""
+    body, _, sig = uid.partition(".")
+    if not body or not sig:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+    except ValueError:
+        return None
+    if not hmac.compare_digest(sig, _sign(raw)):
+        return None
+    url = raw.decode("utf-8", "replace")
+    return url if url.startswith(("http://", "https://")) else None
+
+def _ref_path(url: str) -> str:
+    return os.path.join(IMAGE_PROXY_DIR, "refs", hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+def _blob_path(content: str, width: int) -> str:
+    return os.path.join(IMAGE_PROXY_DIR, "blobs", content, f"{width}.jpg")
+
+def _write_atomic(path: str, data: bytes):
+    d = os.path.dirname(path)
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")  # 스레드/프로세스마다 다른 임시 파일
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+def _lookup(url: str, width: int) -> Optional[str]:
+    """이미 저장된 썸네일이면 content 해시 (디스크 I/O - executor 에서 실행)"""
+    try:
+        with open(_ref_path(url), "r", encoding="utf-8") as f:
+            content = json.load(f).get("content")
+    except (OSError, ValueError):
+        return None
+    if not content or not os.path.exists(_blob_path(content, width)):
+        return None
+    try:
+        os.utime(os.path.dirname(_blob_path(content, width)))  # 마지막 사용 시각 (정리 순서 기준)
+        os.utime(_ref_path(url))
+    except OSError:
+        pass
+    return content
+
+def pick_width(w: Optional[int]) -> int:
+    """요청 너비 이상인 가장 작은 표준 너비 (없으면 가장 큰 것)"""
+    w = w or IMAGE_PROXY_DEFAULT_WIDTH
+    for std in IMAGE_PROXY_WIDTHS:
+        if std >= w:
+            return std
+    return IMAGE_PROXY_WIDTHS[-1]
+
+def proxy_url(url: Optional[str]) -> Optional[str]:
+    """외부 이미지 URL -> 프록시 URL (순수 계산, 원본은 첫 요청 때 가져옴)"""
+    if not IMAGE_PROXY or not url or not url.startswith(("http://", "https://")):
+        return url
+    return f"{IMAGE_PROXY_BASE_URL}/api/images/{url_id(url)}"
+
+def _render(raw: bytes) -> Dict[int, bytes]:
+    """원본 -> 표준 너비별 JPEG (원본보다 크게 늘리지 않음)"""
+    img = Image.open(io.BytesIO(raw))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    out = {}
+    for w in IMAGE_PROXY_WIDTHS:
+        if img.width > w:
+            thumb = img.resize((w, max(1, round(img.height * w / img.width))), Image.LANCZOS)
+        else:
+            thumb = img
+        buf = io.BytesIO()
+        thumb.save(buf, format="JPEG", quality=IMAGE_PROXY_QUALITY, optimize=True, progressive=True)
+        out[w] = buf.getvalue()
+    return out
+
+def _is_public_ip(addr: str) -> bool:
+    ip = ipaddress.ip_address(addr.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+async def _check_public(url: str):
+    """http(s) + 공인 IP 로만 풀리는 호스트인지 확인 (아니면 ImageProxyError)"""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ImageProxyError(f"unsupported url: {url[:100]}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        raise ImageProxyError(f"cannot resolve {parts.hostname}: {e}")
+    if not infos or not all(_is_public_ip(info[4][0]) for info in infos):
+        raise ImageProxyError(f"non-public host: {parts.hostname}")
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for name in os.listdir(path):
+        try:
+            total += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            pass
+    return total
+
+def _sweep():
+    """오래 안 쓴 썸네일 정리: 보관 기간 초과분 삭제 후에도 용량 상한을 넘으면 오래된 것부터 삭제"""
+    now = time.time()
+    max_age = IMAGE_PROXY_MAX_AGE_DAYS * 86400
+    blobs_dir = os.path.join(IMAGE_PROXY_DIR, "blobs")
+    entries = []  # (마지막 사용, 크기, 경로)
+    try:
+        names = os.listdir(blobs_dir)
+    except OSError:
+        names = []
+    for name in names:
+        path = os.path.join(blobs_dir, name)
+        try:
+            entries.append((os.path.getmtime(path), _dir_size(path), path))
+        except OSError:
+            continue
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    cap = IMAGE_PROXY_MAX_MB * 1024 * 1024
+    removed = 0
+    for mtime, size, path in entries:
+        if now - mtime <= max_age and total <= cap * 0.9:  # 상한의 90% 까지 줄여서 매번 정리하지 않게
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+
+    # ref 는 작지만 URL 수만큼 쌓이므로 같은 보관 기간으로 정리 (blob 이 지워진 ref 는 다음 요청에 다시 받음)
+    refs_dir = os.path.join(IMAGE_PROXY_DIR, "refs")
+    try:
+        refs = os.listdir(refs_dir)
+    except OSError:
+        refs = []
+    for name in refs:
+        path = os.path.join(refs_dir, name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.unlink(path)
+        except OSError:
+            pass
+    proxy_stats.evicted += removed
+    proxy_stats.disk_bytes = total
+
+def _store_blobs(content: str, rendered: Dict[int, bytes]):
+    for w, data in rendered.items():
+        _write_atomic(_blob_path(content, w), data)
+
+class _ProxyStats:
+    def __init__(self):
+        self.hits = 0
+        self.fetches = 0
+        self.failures = 0
+        self.dedup = 0
+        self.renders = 0
+        self.render_time = 0.0
+        self.evicted = 0
+        self.disk_bytes = None  # 마지막 정리 때 잰 값
+        self.last_sweep = 0.0
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits, "fetches": self.fetches, "failures": self.failures,
+                "dedup": self.dedup, "renders": self.renders, "widths": IMAGE_PROXY_WIDTHS,
+                "evicted": self.evicted, "diskBytes": self.disk_bytes,
+                "avgRenderSec": round(self.render_time / self.renders, 4) if self.renders else 0.0}
+
+proxy_stats = _ProxyStats()
+
+def _store(url: str, content: str, rendered: Optional[Dict[int, bytes]]):
+    if rendered is not None:
+        _store_blobs(content, rendered)
+    _write_atomic(_ref_path(url), json.dumps({"url": url, "content": content}).encode("utf-8"))
+
+async def _download(url: str) -> bytes:
+    """리다이렉트를 직접 따라가며 매 홉마다 공인 호스트인지 확인"""
+    client = http_pools.download_client()
+    for _ in range(IMAGE_PROXY_MAX_REDIRECTS + 1):
+        await _check_public(url)
+        async with client.stream("GET", url, follow_redirects=False) as r:
+            if r.is_redirect:
+                url = str(r.url.join(r.headers["location"]))
+                continue
+            if r.status_code != 200:
+                raise ImageProxyError(f"upstream status {r.status_code}")
+            chunks, size = [], 0
+            async for chunk in r.aiter_bytes():
+                size += len(chunk)
+                if size > IMAGE_PROXY_MAX_BYTES:
+                    raise ImageProxyError("upstream image too large")
+                chunks.append(chunk)
+            return b"".join(chunks)
+    raise ImageProxyError("too many redirects")
+
+async def _fetch_and_store(url: str) -> str:
+    raw = await _download(url)
+    content = hashlib.sha256(raw).hexdigest()
+
+    loop = asyncio.get_running_loop()
+    rendered = None
+    if await asyncio.to_thread(os.path.exists, _blob_path(content, IMAGE_PROXY_WIDTHS[-1])):
+        proxy_stats.dedup += 1  # 다른 URL 로 이미 받아 둔 같은 이미지
+    else:
+        t0 = time.time()
+        try:
+            rendered = await loop.run_in_executor(_executor, _render, raw)
+        except Exception as e:
+            raise ImageProxyError(f"not a decodable image: {e}")
+        proxy_stats.renders += 1
+        proxy_stats.render_time += time.time() - t0
+    await asyncio.to_thread(_store, url, content, rendered)
+    proxy_stats.fetches += 1
+    if time.time() - proxy_stats.last_sweep > IMAGE_PROXY_SWEEP_SEC:
+        proxy_stats.last_sweep = time.time()
+        asyncio.get_running_loop().run_in_executor(_executor, _sweep)
+    return content
+
+async def resolve(uid: str, width: Optional[int] = None) -> Dict:
+    """프록시 id -> {"path", "content", "width", "url"}. 처음이면 원본을 받아 썸네일 생성"""
+    url = decode_id(uid) if IMAGE_PROXY else None  # 서명 검증 (임의 URL / 경로 조작 방지)
+    if url is None:
+        raise FileNotFoundError(uid)
+    w = pick_width(width)
+    content = await asyncio.to_thread(_lookup, url, w)  # 파일 I/O 는 이벤트 루프 밖에서
+    if content:
+        proxy_stats.hits += 1
+    else:
+        try:
+            content = await proxy_flight.do(url, lambda: _fetch_and_store(url))
+        except Exception:
+            proxy_stats.failures += 1
+            raise
+    return {"path": _blob_path(content, w), "content": content, "width": w, "url": url}
+
+def image_proxy_stats() -> Dict:
+    return {"enabled": IMAGE_PROXY, **proxy_stats.stats()}
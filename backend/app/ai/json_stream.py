@@ -0,0 +1,78 @@
+# json_stream.py
+import json
+from typing import Any, List, Tuple
+
+class JSONFieldStream:
+    """스트리밍으로 들어오는 JSON 객체에서 최상위 필드가 완성될 때마다 (key, value) 반환.
+
+    모델이 code fence 나 앞뒤 잡문을 붙여도 첫 '{' 부터 읽는다.
+    feed() 는 지금까지 새로 완성된 필드만 돌려준다.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0            # 다음에 스캔할 위치
+        self._started = False    # 최상위 '{' 를 만났는지
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+        self._key_start = None   # depth 1 에서 key 문자열 시작 위치
+        self._key = None
+        self._value_start = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.buffer += chunk
+        out: List[Tuple[str, Any]] = []
+        buf = self.buffer
+        i = self._pos
+        while i < len(buf) and not self.done:
+            ch = buf[i]
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                i += 1
+                continue
+
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+                    if self._depth == 1 and self._key is None and self._key_start is not None:
+                        self._key = json.loads(buf[self._key_start:i + 1])
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_str = True
+                if self._depth == 1 and self._key is None:
+                    self._key_start = i
+            elif ch == ":" and self._depth == 1 and self._key is not None and self._value_start is None:
+                self._value_start = i + 1
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buf, i, out)
+                    self.done = True
+            elif ch == "," and self._depth == 1:
+                self._emit(buf, i, out)
+            i += 1
+        self._pos = i
+        return out
+
+    def _emit(self, buf: str, end: int, out: List[Tuple[str, Any]]):
+        if self._key is not None and self._value_start is not None:
+            raw = buf[self._value_start:end].strip()
+            try:
+                out.append((self._key, json.loads(raw)))
+            except ValueError:
+                pass  # 불완전/비정상 값은 건너뛰고 최종 파싱에 맡김
+        self._key_start = self._key = self._value_start = None
+
+    def text(self) -> str:
+        return self.buffer
@@ -0,0 +1,255 @@
+# llm_gateway.py
+import os, time, heapq, random, asyncio, logging, itertools
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from google import genai
+from app.ai.fake_backends import backend_for, FakeGenAIClient
+from app.ai.metrics import Latency
+
+load_dotenv()
+GENAI_API_KEY = os.getenv("GOOGLE_API_KEY")
+MODEL_NAME = "gemini-2.5-flash"
+
+# 우선순위 (작을수록 먼저)
+PRIORITY_INTERACTIVE = 0   # 사용자 검색/분석
+PRIORITY_BATCH = 1         # 메뉴 일괄 분석
+PRIORITY_BACKGROUND = 2    # 캐시 워밍 등
+
+LLM_RPM = float(os.getenv("LLM_RPM", 1000))                  # 분당 요청 수
+LLM_TPM = float(os.getenv("LLM_TPM", 1_000_000))             # 분당 토큰 수 (입력 추정 + max_output_tokens)
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", 1))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 32))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", 8))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+RETRY_STATUS = {429, 503}
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """분당 rate 를 초 단위로 리필하는 토큰 버킷 (대기열은 우선순위 순, 같은 우선순위는 먼저 온 순)"""
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._waiters = []           # heap of (priority, seq, n, future)
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self, n: float = 1.0, priority: int = PRIORITY_INTERACTIVE):
+        n = min(n, self.capacity)  # 버킷보다 큰 요청은 가득 찰 때까지만 대기
+        self._refill()
+        if not self._waiters and self.tokens >= n:
+            self.tokens -= n
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), n, fut))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():  # 토큰을 받은 직후 취소 → 반납
+                self.tokens = min(self.capacity, self.tokens + n)
+            raise
+
+    async def _run(self):
+        """대기열 맨 앞(가장 높은 우선순위)에 토큰이 찰 때마다 넘겨줌. 자는 동안 더 급한 요청이 오면 그쪽이 먼저"""
+        while self._waiters:
+            _, _, n, fut = self._waiters[0]
+            if fut.done():
+                heapq.heappop(self._waiters)
+                continue
+            self._refill()
+            if self.tokens >= n:
+                heapq.heappop(self._waiters)
+                self.tokens -= n
+                fut.set_result(None)
+                continue
+            await asyncio.sleep((n - self.tokens) / self.rate)
+
+class AdaptiveLimiter:
+    """AIMD 동시성 제한 + 우선순위 대기열.
+
+    성공이 limit 번 쌓이면 limit += 1, 429/503 이면 limit *= 0.5
+    """
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.limit = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._successes = 0
+        self._waiters = []           # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: int):
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():  # 슬롯을 받은 직후 취소 → 반납
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.limit:
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.cancelled():
+                continue
+            self.in_flight += 1
+            fut.set_result(None)
+
+    def on_success(self):
+        self._successes += 1
+        if self._successes >= self.limit:
+            self._successes = 0
+            self.limit = min(self.maximum, self.limit + 1)
+            self._wake()
+
+    def on_throttle(self):
+        self._successes = 0
+        self.limit = max(self.minimum, int(self.limit * 0.5))
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, f in self._waiters if not f.done())
+
+_STATUS_NAMES = {"RESOURCE_EXHAUSTED": 429, "UNAVAILABLE": 503}
+
+def _status_of(e: Exception) -> Optional[int]:
+    """google-genai APIError 의 code(HTTP 상태) / status(gRPC 이름) 만 봄 (메시지 문자열은 보지 않음)"""
+    code = getattr(e, "code", None)
+    if not isinstance(code, int):
+        code = getattr(e, "status_code", None)
+    if isinstance(code, int):
+        return code
+    status = getattr(e, "status", None)
+    return _STATUS_NAMES.get(status) if isinstance(status, str) else None
+
+def _make_client():
+    if backend_for("LLM") == "fake":  # 오프라인 벤치마크용
+        return FakeGenAIClient()
+    return genai.Client(api_key=GENAI_API_KEY)
+
+class LLMGateway:
+    """Gemini 호출 단일 창구: 요청/토큰 rate limit, 적응형 동시성, 429/503 재시도, 우선순위"""
+    def __init__(self, client=None):
+        self.client = client or _make_client()
+        self.rpm = TokenBucket(LLM_RPM)
+        self.tpm = TokenBucket(LLM_TPM)
+        self.limiter = AdaptiveLimiter(LLM_INITIAL_CONCURRENCY, LLM_MIN_CONCURRENCY, LLM_MAX_CONCURRENCY)
+        self.queue_wait = Latency()   # 슬롯 + rate limit 대기 시간
+        self.upstream = Latency()     # Gemini 호출 자체 시간
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.errors = 0
+        self.by_caller: Dict[str, int] = {}
+
+    @staticmethod
+    def _estimate_tokens(contents, config: Dict) -> int:
+        return len(str(contents)) // 4 + int((config or {}).get("max_output_tokens", 0))
+
+    async def _admit(self, priority: int, tokens: int):
+        # rate limit 을 먼저 통과한 뒤 슬롯을 잡음 (rate limit 대기 중에 슬롯을 붙잡지 않도록)
+        t0 = time.monotonic()
+        await self.rpm.take(1, priority)
+        await self.tpm.take(tokens, priority)
+        await self.limiter.acquire(priority)
+        self.queue_wait.add(time.monotonic() - t0)
+
+    def _retryable(self, e: Exception, attempt: int, yielded: bool = False) -> bool:
+        status = _status_of(e)
+        if status in RETRY_STATUS:
+            self.throttled += 1
+            self.limiter.on_throttle()
+        if status not in RETRY_STATUS or attempt == LLM_MAX_RETRIES or yielded:
+            self.errors += 1
+            return False
+        return True
+
+    async def _backoff(self, attempt: int):
+        self.retries += 1
+        delay = min(20.0, 0.5 * (2 ** attempt)) * random.uniform(0.5, 1.5)  # jitter
+        logger.warning("LLM throttled, retry %d in %.2fs", attempt + 1, delay)
+        await asyncio.sleep(delay)
+
+    def _count(self, caller: str):
+        self.requests += 1
+        self.by_caller[caller] = self.by_caller.get(caller, 0) + 1
+
+    async def generate(self, contents, config: Dict, *, model: str = MODEL_NAME,
+                       priority: int = PRIORITY_INTERACTIVE, caller: str = "default"):
+        self._count(caller)
+        tokens = self._estimate_tokens(contents, config)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await self._admit(priority, tokens)
+            t0 = time.monotonic()
+            try:
+                resp = await self.client.aio.models.generate_content(model=model, contents=contents, config=config)
+            except Exception as e:
+                if not self._retryable(e, attempt):
+                    raise
+            else:
+                self.limiter.on_success()
+                return resp
+            finally:
+                self.upstream.add(time.monotonic() - t0)
+                self.limiter.release()
+            await self._backoff(attempt)  # 슬롯을 반납한 상태로 대기
+
+    async def generate_stream(self, contents, config: Dict, *, model: str = MODEL_NAME,
+                              priority: int = PRIORITY_INTERACTIVE, caller: str = "default"):
+        """스트리밍 호출. 재시도는 첫 chunk 를 받기 전까지만, 슬롯은 스트림이 끝날 때까지 점유"""
+        self._count(caller)
+        tokens = self._estimate_tokens(contents, config)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await self._admit(priority, tokens)
+            t0 = time.monotonic()
+            yielded = False
+            try:
+                stream = await self.client.aio.models.generate_content_stream(
+                    model=model, contents=contents, config=config)
+                async for chunk in stream:
+                    yielded = True
+                    yield chunk
+            except Exception as e:
+                if not self._retryable(e, attempt, yielded):
+                    raise
+            else:
+                self.limiter.on_success()
+                return
+            finally:
+                self.upstream.add(time.monotonic() - t0)
+                self.limiter.release()
+            await self._backoff(attempt)
+
+    def stats(self) -> Dict:
+        return {
+            "concurrencyLimit": self.limiter.limit,
+            "inFlight": self.limiter.in_flight,
+            "queued": self.limiter.queued,
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "byCaller": dict(self.by_caller),
+            "queueWait": self.queue_wait.stats(),
+            "upstreamLatency": self.upstream.stats(),
+        }
+
+# 전역 인스턴스
+llm = LLMGateway()
@@ -0,0 +1,22 @@
+# metrics.py
+"""/api/ai/metrics 용 가벼운 통계 도구 (외부 의존성 없음)"""
+from collections import deque
+from typing import Dict
+
+class Latency:
+    """최근 size 개 샘플의 백분위 + 누적 평균 (초 단위가 기본, 바이트/개수 분포에도 사용)"""
+    def __init__(self, size: int = 1024):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, sec: float):
+        self.samples.append(sec)
+        self.count += 1
+        self.total += sec
+
+    def stats(self) -> Dict:
+        xs = sorted(self.samples)
+        pct = lambda p: round(xs[min(len(xs) - 1, int(p * len(xs)))], 4) if xs else 0.0
+        return {"count": self.count, "avg": round(self.total / self.count, 4) if self.count else 0.0,
+                "p50": pct(0.5), "p95": pct(0.95), "max": round(xs[-1], 4) if xs else 0.0}
@@ -1,63 +1,325 @@
 # ocr_service.py
 from collections import Counter
-import os, re, time, logging, cv2, json
-from typing import Dict, List, Optional, Tuple
+import os, re, time, logging, json, asyncio, hashlib, bisect
+import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from dotenv import load_dotenv
 from google.cloud import vision
 from google.oauth2 import service_account
 from statistics import median
-from app.ai.image_preprocess import preprocess_image
+from app.ai.image_preprocess import preprocess_and_encode, init_worker
+from app.ai.fake_backends import backend_for, FakeVisionClient
+from app.ai.metrics import Latency
+from app.ai.cache import build_cache
+from app.ai.single_flight import SingleFlight
+from app.ai.text_utils import normalize_text
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
-cred_json = os.getenv("GOOGLE_OCR_CREDENTIALS")  
-info = json.loads(cred_json)
-creds = service_account.Credentials.from_service_account_info(info)
-client = vision.ImageAnnotatorClient(credentials=creds)
+def _make_client():
+    if backend_for("VISION") == "fake":  # 오프라인 벤치마크용
+        return FakeVisionClient()
+    cred_json = os.getenv("GOOGLE_OCR_CREDENTIALS")  
+    info = json.loads(cred_json)
+    creds = service_account.Credentials.from_service_account_info(info)
+    return vision.ImageAnnotatorClient(credentials=creds)
+
+client = _make_client()
+
+# ---------- 이벤트 루프 밖에서 OCR 실행 ----------
+OCR_PREPROCESS_WORKERS = int(os.getenv("OCR_PREPROCESS_WORKERS", min(4, os.cpu_count() or 1)))  # 0 이면 스레드에서 실행
+OCR_CV_THREADS = int(os.getenv("OCR_CV_THREADS", 1))               # 워커 프로세스당 OpenCV 스레드 수
+OCR_VISION_CONCURRENCY = int(os.getenv("OCR_VISION_CONCURRENCY", 8))
+OCR_VISION_BATCH = int(os.getenv("OCR_VISION_BATCH", 16))         # batch_annotate_images 1회당 최대 장수 (Vision 동기 배치 상한)
+
+class OCRPipeline:
+    """전처리(CPU)는 프로세스 풀, Vision 호출(블로킹 I/O)은 전용 스레드 풀에서 실행
+
+    - 프로세스 풀은 spawn 으로 띄워 (grpc/이벤트 루프 스레드를 fork 하지 않음) 처음 쓸 때 생성
+    - 단계별 대기열 길이와 시간(queue wait / preprocess / encode / vision / group)을 기록
+    """
+    STAGES = ("preprocessQueue", "preprocess", "encode", "visionQueue", "vision", "group", "total")
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._vision = ThreadPoolExecutor(max_workers=OCR_VISION_CONCURRENCY, thread_name_prefix="vision")
+        self.pending = {"preprocess": 0, "vision": 0}
+        self.stages = {name: Latency() for name in self.STAGES}
+        self.encoded_bytes = Latency()  # 초가 아닌 바이트 분포 (같은 통계 타입 재사용)
+        self.batch_sizes = Latency()    # 배치 Vision 호출당 장수 분포
+        self.formats: Dict[str, int] = {}
+        self.errors = 0
+        self.pool_restarts = 0
+
+    def _process_pool(self) -> Optional[ProcessPoolExecutor]:
+        if OCR_PREPROCESS_WORKERS <= 0:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=OCR_PREPROCESS_WORKERS, mp_context=mp.get_context("spawn"),
+                initializer=init_worker, initargs=(OCR_CV_THREADS,))
+        return self._pool
+
+    def _reset_pool(self, broken: ProcessPoolExecutor):
+        if self._pool is broken:  # 동시에 실패한 다른 요청이 이미 교체했으면 그대로 사용
+            self._pool = None
+            self.pool_restarts += 1
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        """워커 프로세스를 미리 띄워 첫 요청이 spawn 비용을 내지 않게 함"""
+        pool = self._process_pool()
+        if pool is not None:
+            for _ in range(OCR_PREPROCESS_WORKERS):
+                pool.submit(init_worker, OCR_CV_THREADS)
+
+    async def preprocess(self, image_bytes: bytes) -> Tuple[bytes, float]:
+        """(Vision 에 보낼 바이트, 응답 좌표를 고정 좌표 공간으로 돌리는 배율)"""
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        self.pending["preprocess"] += 1
+        try:
+            pool = self._process_pool()
+            try:
+                data, t = await loop.run_in_executor(pool, preprocess_and_encode, image_bytes)
+            except BrokenProcessPool:
+                # 워커가 OOM/segfault 로 죽으면 풀 전체가 깨짐 -> 새 풀로 교체하고 한 번만 재시도
+                logging.warning("OCR preprocess pool broken, restarting")
+                self._reset_pool(pool)
+                data, t = await loop.run_in_executor(self._process_pool(), preprocess_and_encode, image_bytes)
+        finally:
+            self.pending["preprocess"] -= 1
+        self.stages["preprocessQueue"].add(max(0.0, t["startedAt"] - submitted))
+        self.stages["preprocess"].add(t["preprocess"])
+        self.stages["encode"].add(t["encode"])
+        self.encoded_bytes.add(t["bytes"])
+        self.formats[t["format"]] = self.formats.get(t["format"], 0) + 1
+        return data, t["coordScale"]
+
+    async def annotate(self, content: bytes):
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        started = {}
+
+        def call():
+            started["t"] = time.time()
+            return client.document_text_detection(image=vision.Image(content=content))
+
+        self.pending["vision"] += 1
+        try:
+            resp = await loop.run_in_executor(self._vision, call)
+        finally:
+            self.pending["vision"] -= 1
+        t = started.get("t", submitted)
+        self.stages["visionQueue"].add(t - submitted)
+        self.stages["vision"].add(time.time() - t)
+        logging.info("Vision DOC_OCR: %.3fs", time.time() - t)
+        return resp
+
+    async def annotate_batch(self, contents: List[bytes]) -> List:
+        """여러 장을 batch_annotate_images 로 (OCR_VISION_BATCH 장씩 한 번에). 입력 순서대로 응답 반환"""
+        loop = asyncio.get_running_loop()
+        feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+
+        async def run(chunk: List[bytes]) -> List:
+            submitted = time.time()
+            started = {}
+
+            def call():
+                started["t"] = time.time()
+                requests = [vision.AnnotateImageRequest(image=vision.Image(content=c), features=[feature])
+                            for c in chunk]
+                return list(client.batch_annotate_images(requests=requests).responses)
+
+            self.pending["vision"] += 1
+            try:
+                resps = await loop.run_in_executor(self._vision, call)
+            finally:
+                self.pending["vision"] -= 1
+            t = started.get("t", submitted)
+            self.stages["visionQueue"].add(t - submitted)
+            self.stages["vision"].add(time.time() - t)
+            self.batch_sizes.add(len(chunk))
+            logging.info("Vision DOC_OCR batch(%d): %.3fs", len(chunk), time.time() - t)
+            return resps
+
+        chunks = [contents[i:i + OCR_VISION_BATCH] for i in range(0, len(contents), OCR_VISION_BATCH)]
+        results = await asyncio.gather(*(run(c) for c in chunks))
+        return [r for rs in results for r in rs]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict:
+        return {"workers": OCR_PREPROCESS_WORKERS, "cvThreads": OCR_CV_THREADS,
+                "visionConcurrency": OCR_VISION_CONCURRENCY, "queueDepth": dict(self.pending),
+                "errors": self.errors, "poolRestarts": self.pool_restarts, "stages": {k: v.stats() for k, v in self.stages.items()},
+                "encodedBytes": self.encoded_bytes.stats(), "formats": dict(self.formats),
+                "batchSizes": self.batch_sizes.stats()}
+
+ocr_pipeline = OCRPipeline()
+
+# ---------- OCR 결과 캐시 ----------
+# 같은 메뉴 사진 재업로드 / 같은 image_url 재요청은 전처리 + Vision 호출 없이 바로 번역으로
+# 키: "img:" + 원본 바이트 sha256, "url:" + 정규화 URL -> {"words", "lang"}
+ocr_cache = build_cache("ocr", maxsize=1024, ttl=7 * 24 * 3600, local_ttl=24 * 3600, collection="ocr_cache")
+ocr_flight = SingleFlight("ocr")
+OCR_URL_TTL = float(os.getenv("OCR_URL_TTL", 24 * 3600))  # URL 뒤의 이미지는 바뀔 수 있어 더 짧게
+
+def canonical_url(url: str) -> str:
+    """scheme/host 소문자, 기본 포트/fragment 제거, 쿼리 정렬"""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((parts.scheme == "http" and port == 80) or (parts.scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), host, parts.path or "/", query, ""))
+
+def _url_key(url: str) -> str:
+    return "url:" + hashlib.sha256(canonical_url(url).encode("utf-8")).hexdigest()
+
+def _copy_result(entry: Dict):
+    return [dict(w) for w in entry["words"]], entry["lang"]
+
+async def cached_ocr_for_url(image_url: str):
+    """이미 OCR 한 URL 이면 (words, lang), 아니면 None (다운로드 전에 확인)"""
+    entry = await ocr_cache.get(_url_key(image_url))
+    return _copy_result(entry) if entry is not None else None
+
+async def detect_menu_cached(image_bytes: bytes, image_url: Optional[str] = None):
+    """detect_menu_async + 결과 캐시. 같은 이미지 동시 요청은 Vision 호출 1번으로 합침"""
+    key = "img:" + hashlib.sha256(image_bytes).hexdigest()
+    entry = await ocr_cache.get(key)
+    if entry is None:
+        async def fill():
+            words, lang = await detect_menu_async(image_bytes)
+            value = {"words": words, "lang": lang}
+            await ocr_cache.set(key, value)
+            return value
+        entry = await ocr_flight.do(key, fill)
+    if image_url:
+        await ocr_cache.set(_url_key(image_url), entry, ttl=OCR_URL_TTL)
+    return _copy_result(entry)
+
+async def detect_menus_cached(images: List[bytes], image_urls: Optional[List[Optional[str]]] = None
+                              ) -> List[Union[Tuple[List[Dict], Optional[str]], Exception]]:
+    """여러 장 OCR: 캐시에 없는 사진만 병렬 전처리 후 Vision 배치 호출 1번
+    사진별 (words, lang) 또는 실패한 사진은 예외 객체를 입력 순서대로 반환 (한 장 실패가 전체를 막지 않음)
+    """
+    keys = ["img:" + hashlib.sha256(b).hexdigest() for b in images]
+    entries: Dict[str, Union[Dict, Exception]] = await ocr_cache.get_many(list(dict.fromkeys(keys)))
+    todo = [k for k in dict.fromkeys(keys) if k not in entries]  # 같은 사진 중복 업로드는 1번만
+    if todo:
+        t0 = time.time()
+        first = {k: images[keys.index(k)] for k in todo}
+        contents = await asyncio.gather(*(ocr_pipeline.preprocess(first[k]) for k in todo), return_exceptions=True)
+        ready = []
+        for k, c in zip(todo, contents):
+            if isinstance(c, Exception):
+                entries[k] = c
+            else:
+                ready.append((k, c))
+        try:
+            resps = await ocr_pipeline.annotate_batch([data for _, (data, _) in ready]) if ready else []
+        except Exception as e:
+            resps = [e] * len(ready)
+        t1 = time.time()
+        fresh = {}
+        for (k, (_, scale)), resp in zip(ready, resps):
+            try:
+                if isinstance(resp, Exception):
+                    raise resp
+                words, lang = parse_annotation(resp, scale)
+                entries[k] = fresh[k] = {"words": words, "lang": lang}
+            except Exception as e:
+                entries[k] = e
+        if fresh:
+            await ocr_cache.set_many(fresh)
+        failed = sum(1 for k in todo if isinstance(entries[k], Exception))
+        ocr_pipeline.errors += failed
+        ocr_pipeline.stages["group"].add(time.time() - t1)
+        ocr_pipeline.stages["total"].add(time.time() - t0)
+
+    urls = {}
+    for k, url in zip(keys, image_urls or []):
+        if url and not isinstance(entries[k], Exception):
+            urls[_url_key(url)] = entries[k]
+    if urls:
+        await ocr_cache.set_many(urls, ttl=OCR_URL_TTL)
+    return [entries[k] if isinstance(entries[k], Exception) else _copy_result(entries[k]) for k in keys]
+
+def merge_photo_words(per_photo: List[List[Dict]]) -> List[Dict]:
+    """사진별 메뉴 단어 -> 정규화 텍스트 기준 합집합 (처음 나온 사진/좌표 유지, 겹쳐 찍힌 사진은 photos 에 누적)"""
+    merged: Dict[str, Dict] = {}
+    for idx, words in enumerate(per_photo):
+        for w in words:
+            key = normalize_text(w.get("text", ""))
+            if not key:
+                continue
+            m = merged.get(key)
+            if m is None:
+                merged[key] = {**w, "photo": idx, "photos": [idx]}
+            elif m["photos"][-1] != idx:
+                m["photos"].append(idx)
+    return list(merged.values())
+
+def ocr_stats() -> Dict:
+    return ocr_pipeline.stats()
 
 # 비슷한 y좌표의 글자끼리 묶기 
+# 라인 배정은 입력 순서 + EMA 에 의존하므로 순서는 유지하고, 라인별 높이 중앙값을 정렬 리스트로 유지해
+# 후보 라인마다 median 을 다시 계산하지 않음 (출력은 이전 구현과 동일)
+def _sorted_median(xs):
+    n = len(xs); m = n // 2
+    return xs[m] if n % 2 else (xs[m - 1] + xs[m]) / 2
+
 def group_lines_by_y(tokens, y_alpha=0.65, min_tol=6.0, header_cut=2.2):
-    g_h_med_all = median(t["h"] for t in tokens) # 헤더 컷(아주 큰 글자 제거) 후 전역 높이 중앙값 재추정
-    toks = [t for t in tokens if t["h"] <= header_cut * g_h_med_all] or tokens
+    hs_all = np.fromiter((t["h"] for t in tokens), dtype=float, count=len(tokens))
+    g_h_med_all = float(np.median(hs_all)) # 헤더 컷(아주 큰 글자 제거) 후 전역 높이 중앙값 재추정
+    keep = hs_all <= header_cut * g_h_med_all
+    toks = [t for t, k in zip(tokens, keep.tolist()) if k] or tokens
     g_h_med = median(t["h"] for t in toks)
 
     base_tol = max(min_tol, g_h_med * y_alpha) # 버킷 사이즈를 전역 높이 중앙값
     bucket_size = base_tol
 
-    def bucket_id(y):
-        return int(y // bucket_size)
-
     lines = []  
+    ys = []       # 라인별 y (EMA), 배열로 따로 들고 있다가 마지막에 라인에 기록
+    tols = []     # 라인별 허용 오차 (높이 중앙값 기반, 라인에 글자가 추가될 때만 갱신)
     buckets = {}  
 
     for t in toks:
-        bid = bucket_id(t["cy"])
-        candidate_line_idxs = []
-        for b in (bid - 1, bid, bid + 1):  # 인접 버킷(±1)만 관찰
-            candidate_line_idxs.extend(buckets.get(b, []))
-
+        cy = t["cy"]
+        bid = int(cy // bucket_size)
         best_i, best_dy = None, None
-
-        for i in candidate_line_idxs:
-            L = lines[i]
-            h_med_line = median(L["hs"]) if L["hs"] else g_h_med
-            tol = max(min_tol, h_med_line * y_alpha)
-            dy = abs(t["cy"] - L["y"])
-            if dy <= tol and (best_dy is None or dy < best_dy):
-                best_i, best_dy = i, dy
+        for b in (bid - 1, bid, bid + 1):  # 인접 버킷(±1)만 관찰
+            for i in buckets.get(b, ()):
+                dy = abs(cy - ys[i])
+                if dy <= tols[i] and (best_dy is None or dy < best_dy):
+                    best_i, best_dy = i, dy
 
         if best_i is None: # 새 라인 생성 + 버킷 등록
             new_idx = len(lines)
-            lines.append({"items": [t], "y": t["cy"], "hs": [t["h"]]})
+            lines.append({"items": [t], "y": cy, "hs": [t["h"]]})
+            ys.append(cy)
+            tols.append(max(min_tol, t["h"] * y_alpha))
             buckets.setdefault(bid, []).append(new_idx)
         else: # 기존 라인에 추가하고 러닝 평균 갱신
             L = lines[best_i]
             L["items"].append(t)
-            old_bid = bucket_id(L["y"])
-            L["y"] = 0.7 * L["y"] + 0.3 * t["cy"]  # EMA로 안정화
-            L["hs"].append(t["h"])
-            new_bid = bucket_id(L["y"])
+            old_bid = int(ys[best_i] // bucket_size)
+            ys[best_i] = 0.7 * ys[best_i] + 0.3 * cy  # EMA로 안정화
+            bisect.insort(L["hs"], t["h"])   # 정렬 상태 유지 -> 중앙값 O(1)
+            tols[best_i] = max(min_tol, _sorted_median(L["hs"]) * y_alpha)
+            new_bid = int(ys[best_i] // bucket_size)
             if new_bid != old_bid:
                 if old_bid in buckets:
                     buckets[old_bid] = [idx for idx in buckets[old_bid] if idx != best_i]
@@ -65,52 +327,77 @@ def group_lines_by_y(tokens, y_alpha=0.65, min_tol=6.0, header_cut=2.2):
                         buckets.pop(old_bid, None)
                 buckets.setdefault(new_bid, []).append(best_i)
 
+    for L, y in zip(lines, ys):
+        L["y"] = y
     return lines
 
+_NUMBER_RE = re.compile(r"\d+(\.\d+)?")
+
+def _grouped_median(values, groups, n_groups):
+    """그룹별 중앙값 (statistics.median 과 같은 값: 짝수 개면 가운데 두 값의 평균)"""
+    order = np.lexsort((values, groups))
+    v = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    out = np.full(n_groups, np.nan)
+    nz = counts > 0
+    lo = starts[nz] + (counts[nz] - 1) // 2
+    hi = starts[nz] + counts[nz] // 2
+    out[nz] = (v[lo] + v[hi]) / 2
+    return out
+
 # x좌표 고려하여 이어붙이거나 분리 
-def merge_line_by_x(line_tokens, x_alpha=1.6, join_with_space=False):
-    gaps = []
-    for a, b in zip(line_tokens, line_tokens[1:]): # 라인의 인접 x 간격 분포 계산
-        gaps.append(max(0.0, b['cx'] - a['cx']))
-    gap_med = median(gaps) if gaps else (median([t['h'] for t in line_tokens]) * 0.6)
+# 모든 라인의 토큰을 한 배열로 펴서 라인별 간격 중앙값/경계/단어별 중앙 좌표를 한 번에 계산
+def merge_lines_by_x(lines_tokens, x_alpha=1.6, join_with_space=False):
+    counts = np.fromiter((len(l) for l in lines_tokens), dtype=np.int64, count=len(lines_tokens))
+    n = int(counts.sum())
+    if n == 0:
+        return []
+    toks = [t for l in lines_tokens for t in l]
+    texts = [t['text'] for t in toks]
+    cx = np.fromiter((t['cx'] for t in toks), dtype=float, count=n)
+    cy = np.fromiter((t['cy'] for t in toks), dtype=float, count=n)
+    hs = np.fromiter((t['h'] for t in toks), dtype=float, count=n)
+    line_id = np.repeat(np.arange(len(lines_tokens)), counts)
+    first = np.zeros(n, dtype=bool)
+    first[np.cumsum(counts)[counts > 0] - counts[counts > 0]] = True  # 라인의 첫 토큰
+
+    # 라인의 인접 x 간격 분포 -> 라인별 임계값 (토큰 1개 라인은 높이 기반)
+    dx = np.empty(n)
+    dx[0] = 0.0
+    dx[1:] = cx[1:] - cx[:-1]                    # dx[i] = 같은 라인의 이전 토큰과의 간격 (first 는 무시)
+    inner = ~first
+    gap_med = _grouped_median(np.maximum(dx[inner], 0.0), line_id[inner], len(lines_tokens))
+    single = counts == 1
+    gap_med[single] = _grouped_median(hs, line_id, len(lines_tokens))[single] * 0.6
     gap_th = gap_med * x_alpha
 
+    # 새 단어 시작: 라인 첫 토큰, 간격이 임계값보다 큰 곳, 숫자 토큰(숫자 자체는 버림)
+    is_num = np.fromiter((_NUMBER_RE.fullmatch(x) is not None for x in texts), dtype=bool, count=n) & inner
+    starts = first | is_num | (inner & (dx > gap_th[line_id]))
+    seg = np.cumsum(starts) - 1
+    keep = ~is_num
+    n_seg = int(seg[-1]) + 1
+    seg_k = seg[keep]
+    med_cx = _grouped_median(cx[keep], seg_k, n_seg)
+    med_cy = _grouped_median(cy[keep], seg_k, n_seg)
+
+    sep = " " if join_with_space else ""
+    parts = [[] for _ in range(n_seg)]
+    for sid, text in zip(seg_k.tolist(), (x for x, k in zip(texts, keep.tolist()) if k)):
+        parts[sid].append(text)
     words = []
-    buf = [line_tokens[0]]
-    def is_number_token(token_text):
-        return re.fullmatch(r"\d+(\.\d+)?", token_text) is not None
-    
-    for prev, cur in zip(line_tokens, line_tokens[1:]):
-        dx = cur['cx'] - prev['cx']
-        if is_number_token(cur['text']):
-            if buf:
-                text = "".join(t['text'] for t in buf) if not join_with_space else " ".join(t['text'] for t in buf)
-                cx = median(t['cx'] for t in buf)
-                cy = median(t['cy'] for t in buf)
-                words.append({"text": text, "cx": cx, "cy": cy})
-            buf = []  # 숫자 토큰은 추가하지 않고 buf 초기화
-            continue
-        if dx <= gap_th: # 같은 단어로 이어붙임
-            buf.append(cur) 
-        else: # 다른 단어로 분리 
-            text = "".join(t['text'] for t in buf) if not join_with_space else " ".join(t['text'] for t in buf)
-            cx = median(t['cx'] for t in buf)
-            cy = median(t['cy'] for t in buf)
-            words.append({"text": text, "cx": cx, "cy": cy})
-            buf = [cur]
-    if buf:
-        text = "".join(t['text'] for t in buf) if not join_with_space \
-            else " ".join(t['text'] for t in buf)
-        cx = median(t['cx'] for t in buf)
-        cy = median(t['cy'] for t in buf)
-        words.append({"text": text, "cx": cx, "cy": cy})
+    for sid, p in enumerate(parts):
+        if p:  # 숫자 토큰만 있던 구간은 단어 없음
+            words.append({"text": sep.join(p), "cx": float(med_cx[sid]), "cy": float(med_cy[sid])})
     return words
 
+def merge_line_by_x(line_tokens, x_alpha=1.6, join_with_space=False):
+    return merge_lines_by_x([line_tokens], x_alpha=x_alpha, join_with_space=join_with_space)
+
 def group_menu_items(words):
     lines = group_lines_by_y(words)
-    merged_words = []
-    for line in lines:
-        merged_words.extend(merge_line_by_x(line["items"], x_alpha=1.6, join_with_space=False))
+    merged_words = merge_lines_by_x([line["items"] for line in lines], x_alpha=1.6, join_with_space=False)
         
     filtered_words = []
     for w in merged_words:
@@ -147,17 +434,32 @@ def group_menu_items(words):
 #     img.save(out_path)
 
 def detect_menu(image_bytes: bytes):
-    img = preprocess_image(image_bytes, rectify=True) # np.ndarray (BGR)
-
-    ok, buf = cv2.imencode(".png", img) # Vision에 넣을 PNG 바이트로 인코드
-    if not ok:
-        raise RuntimeError("Failed to encode image to PNG")
-    png_bytes = buf.tobytes()
+    img_bytes, info = preprocess_and_encode(image_bytes, rectify=True) # Vision에 넣을 바이트 (적응형 해상도/JPEG)
     
     t0 = time.time()
-    resp = client.document_text_detection(image=vision.Image(content=png_bytes))
+    resp = client.document_text_detection(image=vision.Image(content=img_bytes))
     logging.info("Vision DOC_OCR: %.3fs", time.time() - t0)
+    return parse_annotation(resp, info["coordScale"])
+
+async def detect_menu_async(image_bytes: bytes):
+    """detect_menu 와 같은 결과, 전처리/Vision 호출을 이벤트 루프 밖에서 실행"""
+    t0 = time.time()
+    try:
+        content, scale = await ocr_pipeline.preprocess(image_bytes)
+        resp = await ocr_pipeline.annotate(content)
+        t1 = time.time()
+        result = parse_annotation(resp, scale)
+    except Exception:
+        ocr_pipeline.errors += 1
+        raise
+    ocr_pipeline.stages["group"].add(time.time() - t1)
+    ocr_pipeline.stages["total"].add(time.time() - t0)
+    return result
 
+def parse_annotation(resp, coord_scale: float = 1.0):
+    """Vision 응답 -> (메뉴 단어 목록, 대표 언어)
+    coord_scale: 보낸 이미지 좌표 -> 긴 변 2000 기준 좌표 (라인 묶기 임계값과 출력 cx/cy 가 이 공간 기준)
+    """
     if resp.error.message:
         raise RuntimeError(resp.error.message)
 
@@ -178,8 +480,8 @@ def detect_menu(image_bytes: bytes):
                     txt = "".join([s.text for s in w.symbols if s.text])
                     box = w.bounding_box.vertices
                     xs = [v.x for v in box]; ys = [v.y for v in box]
-                    cx = sum(xs) / 4.0; cy = sum(ys) / 4.0
-                    h  = (max(ys) - min(ys)) or 1
+                    cx = sum(xs) / 4.0 * coord_scale; cy = sum(ys) / 4.0 * coord_scale
+                    h  = ((max(ys) - min(ys)) or 1) * coord_scale
                     words.append({"text": txt, "cx": cx, "cy": cy, "h": h})
 
     top_lang = (lang_counts.most_common(1)[0][0].upper()) if lang_counts else None
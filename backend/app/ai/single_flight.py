@@ -0,0 +1,74 @@
+# single_flight.py
+import asyncio, logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# 이름 → SingleFlight 인스턴스 (metrics 엔드포인트에서 한 번에 조회)
+FLIGHT_REGISTRY: Dict[str, "SingleFlight"] = {}
+
+class SingleFlight:
+    """같은 key 로 동시에 들어온 호출을 하나의 in-flight 작업으로 합친다.
+
+    - 첫 호출(leader)이 작업 task 를 만들고, 뒤따르는 호출은 같은 task 를 await
+    - 예외는 기다리던 모든 호출에 그대로 전파
+    - 한 호출이 취소돼도 다른 대기자가 있으면 작업은 계속 진행,
+      마지막 대기자까지 취소되면 작업도 취소
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Any, asyncio.Task] = {}
+        self._waiters: Dict[Any, int] = {}
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+        self.errors = 0
+        self.cancelled = 0
+        FLIGHT_REGISTRY[name] = self
+
+    async def do(self, key, fn: Callable[[], Awaitable]):
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        else:
+            self.collapsed += 1
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters.get(key) == 1 and self._inflight.get(key) is task:
+                task.cancel()  # 마지막 대기자 → 더 이상 결과를 받을 곳이 없음
+                # 취소된 task 가 _done 까지 남아 있으면 그 사이 새 호출이 합류해 CancelledError 를 받음 -> 바로 제거
+                del self._inflight[key]
+                self._waiters.pop(key, None)
+                self.cancelled += 1
+            raise
+        finally:
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _done(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> Dict:
+        return {
+            "inflight": len(self._inflight),
+            "calls": self.calls,
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+        }
+
+def flight_stats() -> Dict:
+    return {name: f.stats() for name, f in FLIGHT_REGISTRY.items()}
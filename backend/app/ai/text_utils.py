@@ -0,0 +1,8 @@
+# text_utils.py
+"""캐시 키/결과 매칭에 쓰는 공용 텍스트 정규화"""
+import unicodedata
+
+def normalize_text(text: str) -> str:
+    """NFKC + 공백 정리 + casefold (전각/반각, 대소문자, 띄어쓰기 차이를 같은 키로)"""
+    t = unicodedata.normalize("NFKC", text or "")
+    return " ".join(t.split()).casefold()
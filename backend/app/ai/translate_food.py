@@ -2,16 +2,29 @@
 import os, json, asyncio, logging
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
-from google import genai
+from app.ai.cache import build_cache, stable_hash
+from app.ai.single_flight import SingleFlight
+from app.ai.text_utils import normalize_text
+from app.ai.llm_gateway import llm, PRIORITY_INTERACTIVE
 
 load_dotenv()
-GENAI_API_KEY = os.getenv("GOOGLE_API_KEY")
 SERVICE_ACCOUNT = os.getenv("FIREBASE_CREDENTIALS")
 MODEL_NAME = "gemini-2.5-flash" 
 MAX_TOKENS = 3000
+CHUNK_MAX_ITEMS = int(os.getenv("TRANSLATE_CHUNK_MAX_ITEMS", 40))    # 청크당 최대 토큰 수
+CHUNK_MAX_CHARS = int(os.getenv("TRANSLATE_CHUNK_MAX_CHARS", 1200))  # 청크당 원문 문자 수 상한
+CHUNK_CONCURRENCY = int(os.getenv("TRANSLATE_CHUNK_CONCURRENCY", 4))  # 동시 Gemini 호출 수
+CHUNK_RETRIES = int(os.getenv("TRANSLATE_CHUNK_RETRIES", 2))
+STREAM_FIRST_BATCH = int(os.getenv("TRANSLATE_STREAM_FIRST_BATCH", 4))  # 스트리밍 첫 배치 크기 (이후 2배씩)
 
 logger = logging.getLogger(__name__)
-client = genai.Client(api_key=GENAI_API_KEY)
+translate_flight = SingleFlight("translate")  # 같은 메뉴 동시 번역 요청 합치기
+# 토큰 단위 번역 메모리: (정규화 토큰, target_language) -> {is_food, translated}
+translation_memory = build_cache("translation", maxsize=20000, ttl=30 * 24 * 3600, local_ttl=24 * 3600,
+                                 collection="translation_memory")
+
+def _memory_key(text: str, target_language: str) -> str:
+    return f"{normalize_text(text)}|{(target_language or '').strip().upper()}"
 
 def _build_prompt(words: List[str], target_lang: str) -> str:
     bullets = "\n".join(f"- {w}" for w in words)
@@ -41,50 +54,144 @@ def safe_load_json(text: str) -> Dict:
             t = t[4:].strip()
     return json.loads(t)
 
-def _align(outputs, inputs: List[str]) -> List[Dict]:
-    if isinstance(outputs, list) and len(outputs) == len(inputs):
-        out = []
-        for w, o in zip(inputs, outputs):
-            is_food = bool(o.get("is_food", False))
-            translated = (o.get("translated") or "").strip() if is_food else ""
-            score = o.get("score", None)
-            try:
-                score = float(score) if score is not None else None
-                if score is not None: score = max(0.0, min(1.0, score))
-            except Exception:
-                score = None
-            out.append({"text": w, "is_food": is_food, "translated": translated, "score": score})
-        return out
-    by_text = {str(o.get("text","")).strip(): o for o in (outputs or [])}
+def _item(w: str, o: Dict) -> Dict:
+    is_food = bool(o.get("is_food", False))
+    translated = (o.get("translated") or "").strip() if is_food else ""
+    score = o.get("score", None)
+    try:
+        score = float(score) if score is not None else None
+        if score is not None: score = max(0.0, min(1.0, score))
+    except Exception:
+        score = None
+    return {"text": w, "is_food": is_food, "translated": translated, "score": score}
+
+def _align(outputs, inputs: List[str]) -> List[Optional[Dict]]:
+    """LLM 출력 -> 입력 순서. text(정규화) 가 같은 항목만 채택, 같은 위치의 text 가 일치하면 그 항목 우선
+    (순서가 밀리거나 바뀐 응답이 엉뚱한 토큰의 번역으로 memory 에 들어가지 않게). 못 찾은 토큰은 None"""
+    outputs = [o for o in outputs if isinstance(o, dict)] if isinstance(outputs, list) else []
+    by_text: Dict[str, Dict] = {}
+    for o in outputs:
+        by_text.setdefault(normalize_text(str(o.get("text", ""))), o)
     out = []
-    for w in inputs:
-        o = by_text.get(w.strip())
-        if not o:
-            out.append({"text": w, "is_food": False, "translated": "", "score": None})
-        else:
-            is_food = bool(o.get("is_food", False))
-            translated = (o.get("translated") or "").strip() if is_food else ""
-            score = o.get("score", None)
-            try:
-                score = float(score) if score is not None else None
-                if score is not None: score = max(0.0, min(1.0, score))
-            except Exception:
-                score = None
-            out.append({"text": w, "is_food": is_food, "translated": translated, "score": score})
+    for i, w in enumerate(inputs):
+        key = normalize_text(w)
+        o = outputs[i] if i < len(outputs) and normalize_text(str(outputs[i].get("text", ""))) == key else by_text.get(key)
+        out.append(_item(w, o) if o is not None else None)
     return out
 
-async def translate_async(words: List[str], target_language: str) -> List[Dict]:
+async def translate_async(words: List[Dict], target_language: str) -> List[Dict]:
     if not words:
         return []
-    prompt = _build_prompt(words, target_language)
-    resp = await client.aio.models.generate_content(
-        model=MODEL_NAME,
-        contents=prompt,
-        config={
+    key = (target_language.strip().upper(), stable_hash(words))
+    foods = await translate_flight.do(key, lambda: _translate_uncached(words, target_language))
+    return [dict(f) for f in foods]  # 합쳐진 호출끼리 결과 dict 를 공유하지 않도록 복사
+
+def _stream_batches(words: List[Dict], first: int, max_items: int) -> List[List[Dict]]:
+    """메뉴 위쪽(라인 순서)부터 작은 배치로: 첫 배치는 빨리 끝나도록 작게, 이후 2배씩 키움"""
+    batches, i, size = [], 0, max(1, first)
+    while i < len(words):
+        batches.append(words[i:i + size])
+        i += size
+        size = min(size * 2, max_items)
+    return batches
+
+async def translate_stream_async(words: List[Dict], target_language: str):
+    """translate_async 의 스트리밍 버전: 배치별로 동시에 번역하고 끝나는 배치부터 음식 항목을 yield"""
+    sem = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+    async def run(batch: List[Dict]) -> List[Dict]:
+        async with sem:  # 먼저 만든(위쪽) 배치가 먼저 슬롯을 얻음
+            return await translate_async(batch, target_language)
+
+    tasks = [asyncio.create_task(run(b)) for b in _stream_batches(words, STREAM_FIRST_BATCH, CHUNK_MAX_ITEMS)]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            for item in await fut:
+                yield item
+    finally:  # 클라이언트가 끊기면 남은 배치 취소
+        pending = [t for t in tasks if not t.done()]
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+async def _translate_uncached(words: List[Dict], target_language: str) -> List[Dict]:
+    texts = [w.get("text", "") for w in words]
+    keys = {t: _memory_key(t, target_language) for t in texts}
+    memo = await translation_memory.get_many(list(keys.values()))
+
+    misses: Dict[str, str] = {}  # memory key -> 대표 원문 (정규화 후 같은 토큰은 1번만 질의)
+    for t in texts:
+        k = keys[t]
+        if k not in memo and k not in misses:
+            misses[k] = t
+    logger.info("translation memory: %d hit / %d miss", len(set(keys.values())) - len(misses), len(misses))
+
+    if misses:
+        aligned = await _llm_translate_chunked(list(misses.values()), target_language)
+        await translation_memory.set_many({  # 실패한 청크(None)는 memory 에 남기지 않음
+            k: {"is_food": o["is_food"], "translated": o["translated"]}
+            for k, o in zip(misses, aligned) if o is not None
+        })
+        for k, o in zip(misses, aligned):
+            memo[k] = o or {"is_food": False, "translated": ""}
+
+    foods = []
+    for w in words:  # 원래 순서대로 병합
+        v = memo.get(keys[w.get("text", "")])
+        if v and v.get("is_food"):
+            foods.append({
+                "text": w.get("text"),
+                "translated": v.get("translated", ""),
+                "cx": w.get("cx"),
+                "cy": w.get("cy"),
+            })
+    return foods
+
+def _chunk(texts: List[str], max_items: int, max_chars: int) -> List[List[str]]:
+    """토큰 수/문자 수 상한으로 묶기 (출력 JSON 이 MAX_TOKENS 에서 잘리지 않게)"""
+    chunks, cur, size = [], [], 0
+    for t in texts:
+        if cur and (len(cur) >= max_items or size + len(t) > max_chars):
+            chunks.append(cur)
+            cur, size = [], 0
+        cur.append(t)
+        size += len(t)
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+async def _llm_translate_chunked(texts: List[str], target_language: str) -> List[Optional[Dict]]:
+    """청크별로 동시 번역 후 입력 순서대로 합침. 실패한 청크만 따로 재시도하고, 끝내 실패하면 None"""
+    chunks = _chunk(texts, CHUNK_MAX_ITEMS, CHUNK_MAX_CHARS)
+    sem = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+    async def run(chunk: List[str]) -> List[Optional[Dict]]:
+        for attempt in range(CHUNK_RETRIES + 1):
+            try:
+                async with sem:
+                    aligned = await _llm_translate(chunk, target_language)
+                if aligned is not None:
+                    return aligned
+                logger.warning("translate chunk empty (%d tokens, attempt %d)", len(chunk), attempt + 1)
+            except Exception as e:  # 잘린 JSON 등
+                logger.warning("translate chunk failed (%d tokens, attempt %d): %s", len(chunk), attempt + 1, e)
+            if attempt < CHUNK_RETRIES:  # 마지막 시도 뒤에는 기다리지 않음
+                await asyncio.sleep(0.5 * (2 ** attempt))
+        return [None] * len(chunk)
+
+    results = await asyncio.gather(*(run(c) for c in chunks))
+    return [o for r in results for o in r]
+
+async def _llm_translate(texts: List[str], target_language: str) -> Optional[List[Dict]]:
+    prompt = _build_prompt(texts, target_language)
+    resp = await llm.generate(
+        prompt,
+        {
             "temperature": 0.1,
             "max_output_tokens": MAX_TOKENS,
             "response_mime_type": "application/json",
         },
+        model=MODEL_NAME, priority=PRIORITY_INTERACTIVE, caller="translate",
     )
     # logger.info("reps: %s", resp)
     text = ""
@@ -92,23 +199,10 @@ async def translate_async(words: List[str], target_language: str) -> List[Dict]:
         p = resp.candidates[0].content.parts[0]
         text = getattr(p, "text", "") or getattr(p, "inline_data", {}).get("data", "")
     if not text:
-        return [{"text": w, "is_food": False, "translated": "", "score": 0.0} for w in words]
+        return None
     try:
         raw = json.loads(text)
     except Exception:
         raw = safe_load_json(text) 
-
-    # logger.info('words : %s', words)
-    # logger.info('raw : %s', raw)
-
-    foods = []
-    for w in words:
-        match = next((o for o in raw if o.get("text") == w.get("text") and o.get("is_food")), None)
-        if match:
-            foods.append({
-                "text": match["text"],
-                "translated": match.get("translated", ""),
-                "cx": w.get("cx"),
-                "cy": w.get("cy"),
-            })
-    return foods
\ No newline at end of file
+    aligned = _align(raw, texts)  # text 기준으로 입력 순서에 맞춤 (못 맞춘 토큰은 None -> memory 에 안 남김)
+    return aligned if any(o is not None for o in aligned) else None  # 하나도 못 맞추면 실패로 보고 재시도
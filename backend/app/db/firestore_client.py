@@ -4,6 +4,7 @@ from typing import Optional, Dict, Any, List
 import os
 import json
 from dotenv import load_dotenv
+from app.ai.fake_backends import backend_for, FakeFirestore
 
 # .env 파일 로드
 load_dotenv()
@@ -57,6 +58,10 @@ class FirestoreClient:
     @property
     def db(self):
         """Firestore 데이터베이스 클라이언트 반환"""
+        if backend_for("DB") == "fake":  # 오프라인 벤치마크용
+            if not self._db:
+                self._db = FakeFirestore()
+            return self._db
         if not self._initialized:
             self._initialize_firebase()
         
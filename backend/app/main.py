@@ -1,14 +1,37 @@
+import os, asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .routers import home, users, search, auth, ai
+from .routers import home, users, search, auth, ai, images
+from .ai.http_pool import http_pools
+from .ai.ocr_service import ocr_pipeline
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 이미지 검색/다운로드용 HTTP 커넥션 풀은 앱 수명 동안 공유
+    await http_pools.start()
+    ocr_pipeline.start()  # OCR 전처리 프로세스 풀
+    # 배치 스케줄러 (로그 정리, 랭킹 재계산, 인기 음식 캐시 워밍) - BATCH_SCHEDULER=on 일 때만
+    # (schedule 패키지가 필요한 모듈이라 켤 때만 import)
+    scheduler = None
+    if os.getenv("BATCH_SCHEDULER", "off").lower() == "on":
+        from .services.batch_scheduler import batch_scheduler as scheduler, start_background_scheduler
+        start_background_scheduler(asyncio.get_running_loop())
+    yield
+    if scheduler is not None:
+        scheduler.stop_scheduler()
+        await scheduler.cancel_warmup()
+    await http_pools.close()
+    ocr_pipeline.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # 라우터 등록
 app.include_router(auth.router)
 app.include_router(home.router)
 app.include_router(users.router)
 app.include_router(search.router)
-app.include_router(ai.router) 
+app.include_router(ai.router)
+app.include_router(images.router)
 
 @app.get("/", tags=["루트"])
 async def root():
@@ -42,7 +65,8 @@ async def root():
             "사용자": "/api/users/{uid}/profile",
             "음식 저장": "/api/users/{uid}/save-food",
             "마이페이지": "/api/users/{uid}/saved-foods",
-            "음식 삭제": "/api/users/{uid}/delete-foods"
+            "음식 삭제": "/api/users/{uid}/delete-foods",
+            "음식 이미지": "/api/images/{id}"
         },
         "features": [
             "Google OAuth 로그인",
@@ -7,7 +7,7 @@ from .search import SimpleSearchRequest, SimpleSearchResponse
 from .user import User, SavedFood, SaveFoodRequest, DeleteSavedFoodsRequest
 
 # 음식 관련
-from .food import FoodInfo, FoodSearchRequest, FoodCreateRequest
+from .food import FoodInfo, DietWarning, FoodSearchRequest, FoodCreateRequest
 
 # 랭킹 관련
 from .ranking import TopFoodSnapshot, CountryRanking
@@ -18,7 +18,7 @@ __all__ = [
     # 사용자
     "User", "SavedFood", "SaveFoodRequest", "DeleteSavedFoodsRequest",
     # 음식
-    "FoodInfo", "FoodSearchRequest", "FoodCreateRequest",
+    "FoodInfo", "DietWarning", "FoodSearchRequest", "FoodCreateRequest",
     # 랭킹
     "TopFoodSnapshot", "CountryRanking"
 ]
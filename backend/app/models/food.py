@@ -1,6 +1,11 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
 
+class DietWarning(BaseModel):
+    """사용자 식단 제한에 걸리는 알레르기 성분"""
+    diet: str = Field(..., description="식단 제한 코드 (dietary_codes와 일치)", example="ISLAM")
+    allergens: List[str] = Field(default=[], description="해당 식단에서 금지된 성분", example=["PORK"])
+
 class FoodInfo(BaseModel):
     """음식 상세 정보 및 AI 응답 처리용"""
     foodName: str = Field(..., description="음식 이름(한국어)", example="돈가스")
@@ -13,6 +18,8 @@ class FoodInfo(BaseModel):
     imageUrl: str = Field(..., description="음식 이미지 URL", example="https://example.com/tonkatsu.jpg")
     imageSource: Optional[str] = Field(None, description="이미지 출처", example="일본 요리 사진")
     culturalBackground: Optional[str] = Field(None, description="문화적 배경", example="일본 메이지 시대에 서양의 커틀릿을 참고하여 만들어진 요리입니다.")
+    allergenConflicts: List[str] = Field(default=[], description="사용자 알레르기와 겹치는 성분", example=["WHEAT"])
+    dietWarnings: List[DietWarning] = Field(default=[], description="사용자 식단 제한 경고")
 
 class FoodSearchRequest(BaseModel):
     """음식 검색 요청"""
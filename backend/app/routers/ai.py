@@ -1,24 +1,47 @@
-import asyncio, time, logging
+import asyncio, time, logging, json, sys
 from fastapi import APIRouter, HTTPException, UploadFile, Form, File, Depends
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Union
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.ai.food_analyzer import _to_thread, extract_user_constraints, get_user_profile, analyze_one_async
-from app.ai.translate_food import translate_async
-from app.ai.ocr_service import detect_menu
+from app.ai.food_analyzer import _to_thread, extract_user_constraints, get_user_profile, analyze_one_async, analyze_batch_async
+from app.ai.translate_food import translate_async, translate_stream_async
+from app.ai.text_utils import normalize_text
+from app.ai.ocr_service import detect_menu_cached, detect_menus_cached, merge_photo_words, cached_ocr_for_url, ocr_stats
+from app.ai.cache import cache_stats
+from app.ai.single_flight import flight_stats
+from app.ai.llm_gateway import llm
 from app.services.user_service import get_current_user
-import httpx
+from app.ai.http_pool import http_pools
+from app.ai.image_fetcher import image_query_stats
+from app.ai.image_proxy import image_proxy_stats
 from app.ai.dto import (
-    AnalyzeOneRequest, AnalyzeOneResponse, MenuItemOut,
+    AnalyzeOneRequest, AnalyzeOneResponse, MenuItemOut, AnalyzeBatchRequest,
+    MultiOCRTranslateResponse, PhotoOCRResult,
 )
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/ai", tags=["ai를 사용하여 음식에 대한 ocr, translate, analyze"])
 
 ALLOWED_CT = {"image/png", "image/jpeg"} # 이미지 허용 포맷 
 MAX_BYTES = 5 * 1024 * 1024  # 이미지 최대 허용 크기5MB
+MAX_PHOTOS = 5  # /ocr-translate/multi 한 요청당 사진 수
+DOWNLOAD_INITIAL_BUFFER = 256 * 1024  # Content-Length 가 없을 때 처음 잡는 버퍼
+# 파일 시그니처 -> Content-Type
+_MAGIC = {b"\x89PNG\r\n\x1a\n": "image/png", b"\xff\xd8\xff": "image/jpeg"}
+_MAGIC_LEN = max(len(m) for m in _MAGIC)
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    for magic, ct in _MAGIC.items():
+        if bytes(head[:len(magic)]) == magic:
+            return ct
+    return None
 
 @router.post("/analyze", response_model=AnalyzeOneResponse)
-async def analyze_one(req: AnalyzeOneRequest):
-    user = await _to_thread(get_user_profile, req.uid)
+async def analyze_one(
+    req: AnalyzeOneRequest,
+    current_user: Optional[dict] = Depends(get_current_user)
+):
+    uid = current_user.get('uid') if current_user else None
+    user = await _to_thread(get_user_profile, uid) if uid else {}
     cons = extract_user_constraints(user or {})
 
     try:
@@ -28,6 +51,28 @@ async def analyze_one(req: AnalyzeOneRequest):
         logger.exception("analyze-one failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/analyze-batch")
+async def analyze_batch(
+    req: AnalyzeBatchRequest,
+    current_user: Optional[dict] = Depends(get_current_user)
+):
+    """메뉴 전체 분석: 음식별 결과를 완료되는 순서대로 NDJSON 한 줄씩 스트리밍"""
+    uid = current_user.get('uid') if current_user else None
+    user = await _to_thread(get_user_profile, uid) if uid else {}
+    cons = extract_user_constraints(user or {})
+
+    async def ndjson():
+        kwargs = {"pack_size": req.pack_size} if req.pack_size else {}
+        try:
+            async for item in analyze_batch_async(cons, req.source_language, req.target_language,
+                                                  req.food_names, **kwargs):
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.exception("analyze-batch failed: %s", e)
+            yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 @router.post("/ocr-translate", response_model=List[MenuItemOut])
 async def ocr_translate(
     target_language: str = Form(..., description="번역 대상 언어 코드(KR,EN)"),
@@ -40,14 +85,7 @@ async def ocr_translate(
     if uid is None: 
         raise HTTPException(status_code=401, detail="User not registered")
     
-    try:
-        data = await read_image_bytes(file, image_url)
-        words, lang = detect_menu(data)
-        # logger.info("Detected Language: %s", lang)
-        logger.info("Detected Words: %s", words)
-    except Exception as e:
-        logger.exception("OCR failed: %s", e)
-        raise HTTPException(status_code=500, detail=str(e))
+    words, lang = await _ocr_words(file, image_url)
     
     try:
         translated = await translate_async(words, target_language)
@@ -57,7 +95,154 @@ async def ocr_translate(
     # logger.info('translated : %s',translated)
     return translated
 
-async def read_image_bytes(file: Optional[UploadFile], image_url: Optional[str]) -> bytes:
+@router.post("/ocr-translate/stream")
+async def ocr_translate_stream(
+    target_language: str = Form(..., description="번역 대상 언어 코드(KR,EN)"),
+    file: Optional[UploadFile] = File(None, description="이미지 파일 (multipart/form-data)"),
+    image_url: Optional[str] = Form(None, description="이미지 URL"),
+    stream_format: str = Form("ndjson", description="ndjson | sse"),
+    current_user: Optional[dict] = Depends(get_current_user)
+):
+    """ocr-translate 스트리밍: 메뉴 위쪽부터 작은 배치로 번역해 번역된 MenuItemOut 을 끝나는 대로 전송
+    (event: ocr / item / done / error)"""
+    uid = current_user.get('uid') if current_user else None
+    if uid is None: 
+        raise HTTPException(status_code=401, detail="User not registered")
+
+    words, lang = await _ocr_words(file, image_url)  # OCR 실패는 스트림 시작 전에 HTTP 에러로
+
+    async def events():
+        yield {"event": "ocr", "data": {"words": len(words), "lang": lang}}
+        count = 0
+        try:
+            async for item in translate_stream_async(words, target_language):
+                count += 1
+                yield {"event": "item", "data": MenuItemOut(**item).model_dump()}
+        except Exception as e:
+            logger.exception("Translate stream failed: %s", e)
+            yield {"event": "error", "data": {"error": str(e)}}
+        yield {"event": "done", "data": {"count": count}}
+
+    if stream_format == "sse":
+        async def sse():
+            async for ev in events():
+                yield f"event: {ev['event']}\ndata: {json.dumps(ev['data'], ensure_ascii=False)}\n\n"
+        return StreamingResponse(sse(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def ndjson():
+        async for ev in events():
+            yield json.dumps(ev, ensure_ascii=False) + "\n"
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.post("/ocr-translate/multi", response_model=MultiOCRTranslateResponse)
+async def ocr_translate_multi(
+    target_language: str = Form(..., description="번역 대상 언어 코드(KR,EN)"),
+    files: List[UploadFile] = File([], description="메뉴판 사진들 (multipart/form-data)"),
+    image_urls: List[str] = Form([], description="이미지 URL 들"),
+    current_user: Optional[dict] = Depends(get_current_user)
+) -> MultiOCRTranslateResponse:
+    """긴 메뉴판을 여러 장으로 나눠 찍은 경우: 사진별 OCR(병렬 전처리 + Vision 배치 1번) 후
+    사진끼리 겹치는 항목을 정규화 텍스트 기준으로 합쳐 한 번만 번역"""
+    uid = current_user.get('uid') if current_user else None
+    if uid is None: 
+        raise HTTPException(status_code=401, detail="User not registered")
+
+    sources = [(f, None) for f in files] + [(None, u) for u in image_urls if u]
+    if not sources:
+        raise HTTPException(status_code=400, detail="No images")
+    if len(sources) > MAX_PHOTOS:
+        raise HTTPException(status_code=400, detail=f"Too many images (max {MAX_PHOTOS}).")
+
+    results = await _ocr_many(sources)
+    errors = [r for r in results if isinstance(r, Exception)]
+    if len(errors) == len(results):  # 한 장도 못 읽었으면 단일 요청과 같은 에러로
+        if isinstance(errors[0], HTTPException):
+            raise errors[0]
+        raise HTTPException(status_code=500, detail=str(errors[0]))
+
+    photos = []
+    per_photo = []
+    for i, r in enumerate(results):
+        if isinstance(r, Exception):
+            photos.append(PhotoOCRResult(index=i, error=getattr(r, "detail", None) or str(r)))
+            per_photo.append([])
+        else:
+            words, lang = r
+            photos.append(PhotoOCRResult(index=i, words=len(words), lang=lang))
+            per_photo.append(words)
+    merged = merge_photo_words(per_photo)
+    logger.info("multi OCR: %d photos, %d words -> %d unique", len(results), sum(map(len, per_photo)), len(merged))
+
+    try:
+        translated = await translate_async(merged, target_language)
+    except Exception as e:
+        logger.exception("Translate failed: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    by_key = {normalize_text(w["text"]): w for w in merged}
+    items = []
+    for it in translated:
+        w = by_key[normalize_text(it["text"])]
+        items.append({**it, "photo": w["photo"], "photos": w["photos"]})
+    return {"items": items, "photos": photos}
+
+async def _ocr_many(sources: List[tuple]) -> List:
+    """(file, image_url) 목록 -> 사진별 (words, lang) 또는 예외. URL 캐시 확인 후 나머지는 병렬 다운로드 + 배치 OCR"""
+    results: List = [None] * len(sources)
+    for i, (file, url) in enumerate(sources):
+        if file is None:
+            results[i] = await cached_ocr_for_url(url)
+    need = [i for i, r in enumerate(results) if r is None]
+    datas = await asyncio.gather(*(read_image_bytes(*sources[i]) for i in need), return_exceptions=True)
+    ready = []
+    for i, data in zip(need, datas):
+        if isinstance(data, Exception):
+            logger.warning("image %d read failed: %s", i, getattr(data, "detail", data))
+            results[i] = data
+        else:
+            ready.append((i, data))
+    if ready:
+        try:
+            ocr = await detect_menus_cached([d for _, d in ready], [sources[i][1] for i, _ in ready])
+        except Exception as e:
+            logger.exception("OCR failed: %s", e)
+            ocr = [e] * len(ready)
+        for (i, _), r in zip(ready, ocr):
+            results[i] = r
+    return results
+
+async def _ocr_words(file: Optional[UploadFile], image_url: Optional[str]):
+    try:
+        # 같은 이미지/URL 은 OCR 결과 캐시에서 (URL 은 다운로드도 생략)
+        cached = await cached_ocr_for_url(image_url) if not file and image_url else None
+        if cached is not None:
+            words, lang = cached
+        else:
+            data = await read_image_bytes(file, image_url)
+            words, lang = await detect_menu_cached(data, None if file else image_url)  # 전처리/Vision 은 이벤트 루프 밖에서
+        # logger.info("Detected Language: %s", lang)
+        logger.info("Detected Words: %s", words)
+        return words, lang
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("OCR failed: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/metrics")
+async def ai_metrics():
+    """AI 파이프라인 캐시/동시성 지표 (사이징용)"""
+    return {"caches": cache_stats(), "singleFlight": flight_stats(), "llm": llm.stats(),
+            "httpPools": http_pools.stats(), "imageQueries": image_query_stats(), "imageProxy": image_proxy_stats(),
+            "ocr": ocr_stats(), "warmup": _last_warmup()}
+
+def _last_warmup():
+    # 배치 스케줄러는 BATCH_SCHEDULER=on 일 때만 로드됨 (여기서 import 하지 않음)
+    mod = sys.modules.get("app.services.batch_scheduler")
+    return mod.batch_scheduler.last_warmup if mod is not None else None
+
+async def read_image_bytes(file: Optional[UploadFile], image_url: Optional[str]) -> Union[bytes, bytearray]:
+    """업로드는 bytes, URL 다운로드는 미리 잡은 bytearray 를 복사 없이 그대로 반환 (둘 다 버퍼 프로토콜로 소비)"""
     if file: 
         if file.content_type not in ALLOWED_CT:
             raise HTTPException(status_code=415, detail=f"Unsupported Content-Type: {file.content_type}")
@@ -66,12 +251,31 @@ async def read_image_bytes(file: Optional[UploadFile], image_url: Optional[str])
             raise HTTPException(status_code=413, detail="Image too large (max 5MB).")
         return data
 
-    async with httpx.AsyncClient(timeout=15) as client: # file가 없으면 URL 모드라고 가정하고 비동기 HTTP 클라이언트로 이미지를 다운로드
-        r = await client.get(image_url, follow_redirects=True)
+    client = http_pools.download_client() # file가 없으면 URL 모드라고 가정하고 공유 HTTP 풀로 이미지를 다운로드
+    # 전체를 받아 놓고 크기를 보는 대신, 받는 동안 상한/형식을 확인하고 넘으면 바로 끊음
+    async with client.stream("GET", image_url, follow_redirects=True) as r:
         r.raise_for_status()
-        data = r.content
-        
-    if len(data) > MAX_BYTES:
-        raise HTTPException(status_code=413, detail="Image too large (max 5MB).")
-    return data
-
+        length = r.headers.get("content-length", "")
+        if length.isdigit() and int(length) > MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Image too large (max 5MB).")
+        # Content-Length 를 알면 그 크기로, 모르면 작게 잡고 필요할 때만 늘림 (상한 MAX_BYTES)
+        buf = bytearray(int(length) if length.isdigit() and int(length) > 0 else DOWNLOAD_INITIAL_BUFFER)
+        size = 0
+        checked = False
+        async for chunk in r.aiter_bytes():
+            end = size + len(chunk)
+            if end > MAX_BYTES:
+                raise HTTPException(status_code=413, detail="Image too large (max 5MB).")
+            if end > len(buf):
+                buf.extend(bytes(min(MAX_BYTES, max(end, len(buf) * 2)) - len(buf)))
+            buf[size:end] = chunk
+            size = end
+            if not checked and size >= _MAGIC_LEN:  # 첫 바이트로 형식 확인 (Content-Type 헤더는 믿지 않음)
+                ct = sniff_image_type(buf[:_MAGIC_LEN])
+                if ct not in ALLOWED_CT:
+                    raise HTTPException(status_code=415, detail="Unsupported image format (PNG/JPEG only)")
+                checked = True
+    if not checked:
+        raise HTTPException(status_code=415, detail="Unsupported image format (PNG/JPEG only)")
+    del buf[size:]  # 복사 없이 실제 크기로 줄임
+    return buf
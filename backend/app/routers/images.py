@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse
+from typing import Optional
+from app.ai.image_proxy import resolve
+import logging
+
+router = APIRouter(prefix="/api/images", tags=["이미지"])
+logger = logging.getLogger(__name__)
+
+# 같은 id 는 항상 같은 이미지 -> 브라우저/CDN 에서 1년 캐시
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{image_id}")
+async def get_dish_image(image_id: str, w: Optional[int] = Query(None, ge=1, le=4096, description="원하는 너비(px)")):
+    """음식 이미지 썸네일 프록시 (<img> 태그에서 바로 쓰므로 인증 없음)"""
+    try:
+        info = await resolve(image_id, w)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Unknown image id")
+    except Exception as e:
+        # 원본 URL 로 리다이렉트하지 않음 (오픈 리다이렉트 방지) - 짧게 캐시되는 502
+        logger.warning("image proxy failed for %s: %s", image_id, e)
+        raise HTTPException(status_code=502, detail="Image fetch failed", headers={"Cache-Control": "public, max-age=300"})
+
+    etag = f'"{info["content"][:32]}-{info["width"]}"'
+    return FileResponse(info["path"], media_type="image/jpeg",
+                        headers={"Cache-Control": CACHE_CONTROL, "ETag": etag})
@@ -1,11 +1,12 @@
 # @ Test Complete
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from app.models.search import SimpleSearchRequest, SimpleSearchResponse
 from app.services.search_service import SearchService
 from app.services.ranking_service import RankingService
 from app.services.user_service import get_current_user
 from typing import Optional
-import logging
+import logging, json
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/search", tags=["검색"])
@@ -37,6 +38,27 @@ async def search_food(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/stream")
+async def search_food_stream(
+    request: SimpleSearchRequest,
+    current_user: Optional[dict] = Depends(get_current_user)
+):
+    """음식 검색 SSE - dishName, allergens, summary ... 필드가 완성되는 대로 전송 (event: field/image/done/error)"""
+    uid = current_user.get('uid') if current_user else None
+
+    async def sse():
+        async for ev in search_service.search_food_stream(request, uid):
+            yield f"event: {ev['event']}\ndata: {json.dumps(ev['data'], ensure_ascii=False, default=str)}\n\n"
+            if ev["event"] == "done":
+                # 검색 로그 / 국가별 랭킹은 응답을 모두 보낸 뒤 기록
+                if uid:
+                    await search_service.log_search(uid, request.food_name, request.country)
+                if request.country:
+                    await ranking_service.update_country_ranking(request.country, request.food_name)
+
+    return StreamingResponse(sse(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @router.get("/rankings/{country_code}")
 async def get_country_rankings(
     country_code: str,
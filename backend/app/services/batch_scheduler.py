@@ -1,15 +1,32 @@
 import asyncio
+import os
 import schedule
 import time
 from datetime import datetime
 from .ranking_service import RankingService
 from .search_service import SearchService
+from app.ai.dto import AnalyzeOneRequest
+from app.ai.food_analyzer import analyze_one_async, analysis_cache, analysis_cache_key, ANALYSIS_MODE
+from app.ai.llm_gateway import PRIORITY_BACKGROUND
+
+# 캐시 워밍: 국가별 topFoods 를 자주 쓰는 타겟 언어로 미리 분석 (분석 + 이미지 캐시 채움)
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", 10))
+# 클라이언트가 보내는 target_language 코드 그대로 (캐시 키가 이 값 기준이라 KR 대신 ko 로 워밍하면 아무도 못 씀)
+WARMUP_TARGET_LANGS = [l.strip().upper() for l in os.getenv("WARMUP_TARGET_LANGS", "KR,EN,JP,CN").split(",") if l.strip()]
+WARMUP_RPM = float(os.getenv("WARMUP_RPM", 20))                 # 워밍이 쓰는 LLM 호출 상한 (분당)
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", 2))
+WARMUP_INTERVAL_HOURS = int(os.getenv("WARMUP_INTERVAL_HOURS", 6))
+# source_language 도 클라이언트처럼 국가 코드(ES, JP ...)를 그대로 씀. 타겟 언어가 그 나라 말이면 건너뜀
+TARGET_LANG_COUNTRIES = {"KR": {"KR"}, "EN": {"US"}, "JP": {"JP"}, "CN": {"CN"}}
 
 class BatchScheduler:
     def __init__(self):
         self.ranking_service = RankingService()
         self.search_service = SearchService()
         self.is_running = False
+        self.loop = None          # 비동기 작업을 넘길 앱 이벤트 루프
+        self.last_warmup = None   # 마지막 캐시 워밍 결과 (커버리지)
+        self._warmup_task = None  # 진행 중인 캐시 워밍 (종료 시 취소)
     
     async def cleanup_old_logs(self):
         """30일 이상 된 검색 로그 정리"""
@@ -30,6 +47,87 @@ class BatchScheduler:
         except Exception as e:
             print(f"[{datetime.now()}] 랭킹 재계산 오류: {str(e)}")
     
+    async def warm_top_foods(self, top_n: int = WARMUP_TOP_N, target_langs=None):
+        """국가별 topFoods x 타겟 언어 조합의 분석/이미지 캐시를 미리 채움
+
+        - LLM 호출은 PRIORITY_BACKGROUND 로 보내 사용자 요청보다 뒤로 밀리고
+        - WARMUP_RPM 간격으로만 발행해 쿼터를 넘지 않음
+        - 이미 캐시에 있는 조합은 건너뛰고, 커버리지를 last_warmup 에 남김
+        """
+        target_langs = target_langs or WARMUP_TARGET_LANGS
+        self._warmup_task = asyncio.current_task()
+        started = time.time()
+        report = {"startedAt": datetime.now().isoformat(), "countries": {}, "total": 0,
+                  "alreadyWarm": 0, "warmed": 0, "failed": 0}
+        try:
+            print(f"[{datetime.now()}] 캐시 워밍 시작...")
+            docs = self.ranking_service.db.collection('country_rankings').stream()
+            jobs = []
+            for doc in docs:
+                country = doc.id
+                top_foods = (doc.to_dict() or {}).get('topFoods', [])[:top_n]
+                source = country
+                for food in top_foods:
+                    name = food.get('foodName')
+                    if not name:
+                        continue
+                    for lang in target_langs:
+                        if country in TARGET_LANG_COUNTRIES.get(lang.upper(), {lang.upper()}):  # 원어로는 번역 불필요
+                            continue
+                        req = AnalyzeOneRequest(source_language=source, target_language=lang, food_name=name)
+                        jobs.append((country, req))
+
+            # 제약 없는 사용자(또는 shared 모드) 키 기준으로 워밍
+            sem = asyncio.Semaphore(max(1, WARMUP_CONCURRENCY))
+            interval = 60.0 / WARMUP_RPM if WARMUP_RPM > 0 else 0.0
+
+            async def warm(country, req):
+                c = report["countries"][country]
+                try:
+                    async with sem:
+                        data = await analyze_one_async({}, req, priority=PRIORITY_BACKGROUND)
+                    if "error" in data:
+                        report["failed"] += 1
+                    else:
+                        report["warmed"] += 1
+                        c["warm"] += 1
+                except Exception as e:
+                    report["failed"] += 1
+                    print(f"[{datetime.now()}] 캐시 워밍 실패 {req.food_name}/{req.target_language}: {str(e)}")
+
+            tasks = []
+            try:
+                for country, req in jobs:
+                    c = report["countries"].setdefault(country, {"total": 0, "warm": 0})
+                    c["total"] += 1
+                    report["total"] += 1
+                    key = analysis_cache_key({}, req, shared=ANALYSIS_MODE == "shared")
+                    if await analysis_cache.get(key) is not None:
+                        report["alreadyWarm"] += 1
+                        c["warm"] += 1
+                        continue
+                    tasks.append(asyncio.create_task(warm(country, req)))
+                    await asyncio.sleep(interval)  # 발행 속도 제한
+                await asyncio.gather(*tasks)
+            except asyncio.CancelledError:  # 앱 종료: 진행 중인 워밍 호출도 정리
+                for t in tasks:
+                    t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        except Exception as e:
+            print(f"[{datetime.now()}] 캐시 워밍 오류: {str(e)}")
+        finally:
+            for c in report["countries"].values():
+                c["coverage"] = round(c["warm"] / c["total"], 4) if c["total"] else 1.0
+            warm_total = report["alreadyWarm"] + report["warmed"]
+            report["coverage"] = round(warm_total / report["total"], 4) if report["total"] else 1.0
+            report["elapsedSec"] = round(time.time() - started, 2)
+            self.last_warmup = report
+            self._warmup_task = None
+            print(f"[{datetime.now()}] 캐시 워밍 완료: {warm_total}/{report['total']} "
+                  f"(신규 {report['warmed']}, 실패 {report['failed']})")
+        return report
+
     async def daily_maintenance(self):
         """일일 유지보수 작업"""
         try:
@@ -61,9 +159,14 @@ class BatchScheduler:
         # 매시간 검색 로그 정리 (선택사항)
         schedule.every().hour.do(self._run_cleanup_logs)
         
+        # 인기 음식 캐시 워밍 (시작 시 1회 + 주기적으로)
+        schedule.every(WARMUP_INTERVAL_HOURS).hours.do(self._run_warm_top_foods)
+        self._run_warm_top_foods()
+        
         print("배치 스케줄러가 시작되었습니다.")
         print("- 일일 유지보수: 매일 새벽 2시")
         print("- 로그 정리: 매시간")
+        print(f"- 캐시 워밍: {WARMUP_INTERVAL_HOURS}시간마다")
         
         # 스케줄러 루프 실행
         while self.is_running:
@@ -75,13 +178,30 @@ class BatchScheduler:
         self.is_running = False
         print("배치 스케줄러가 중지되었습니다.")
     
+    async def cancel_warmup(self):
+        """진행 중인 캐시 워밍 취소 (앱 이벤트 루프에서 호출)"""
+        task = self._warmup_task
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _submit(self, coro):
+        """스케줄러 스레드에서 앱 이벤트 루프로 코루틴 전달"""
+        if self.loop is not None:
+            return asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return asyncio.create_task(coro)
+    
     def _run_daily_maintenance(self):
         """일일 유지보수 실행 (동기 래퍼)"""
-        asyncio.create_task(self.daily_maintenance())
+        self._submit(self.daily_maintenance())
     
     def _run_cleanup_logs(self):
         """로그 정리 실행 (동기 래퍼)"""
-        asyncio.create_task(self.cleanup_old_logs())
+        self._submit(self.cleanup_old_logs())
+    
+    def _run_warm_top_foods(self):
+        """캐시 워밍 실행 (동기 래퍼)"""
+        self._submit(self.warm_top_foods())
     
     async def run_manual_cleanup(self):
         """수동 로그 정리 실행"""
@@ -90,14 +210,19 @@ class BatchScheduler:
     async def run_manual_ranking_recalc(self):
         """수동 랭킹 재계산 실행"""
         await self.recalculate_rankings()
+    
+    async def run_manual_warmup(self):
+        """수동 캐시 워밍 실행"""
+        return await self.warm_top_foods()
 
 # 전역 인스턴스
 batch_scheduler = BatchScheduler()
 
 # FastAPI 시작 시 스케줄러 시작 (선택사항)
-def start_background_scheduler():
-    """백그라운드에서 스케줄러 실행"""
+def start_background_scheduler(loop=None):
+    """백그라운드에서 스케줄러 실행 (loop: 작업을 실행할 앱 이벤트 루프)"""
     import threading
+    batch_scheduler.loop = loop
     scheduler_thread = threading.Thread(target=batch_scheduler.start_scheduler, daemon=True)
     scheduler_thread.start()
     return scheduler_thread
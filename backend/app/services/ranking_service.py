@@ -2,13 +2,14 @@ from firebase_admin import firestore
 from datetime import datetime, timedelta
 from typing import List, Optional
 from app.models.ranking import CountryRanking, TopFoodSnapshot
+from app.ai.fake_backends import backend_for, FakeFirestore
 import logging
 
 logger = logging.getLogger(__name__)
 
 class RankingService:
     def __init__(self):
-        self.db = firestore.client()
+        self.db = FakeFirestore() if backend_for("DB") == "fake" else firestore.client()  # fake: 오프라인 벤치마크용
     
     async def get_top_foods(self, country: str, limit: int = 3) -> List[TopFoodSnapshot]:
         """국가별 상위 음식 조회 (MVP: 홈화면 Top 3용)"""
@@ -5,7 +5,8 @@ from app.models.search import SimpleSearchRequest, SimpleSearchResponse
 from app.models.ranking import CountryRanking, TopFoodSnapshot
 from app.models.food import FoodInfo
 from app.db.firestore_client import firestore_client
-from app.ai.food_analyzer import _to_thread, extract_user_constraints, get_user_profile, analyze_one_async
+from app.ai.image_proxy import proxy_url
+from app.ai.food_analyzer import _to_thread, extract_user_constraints, get_user_profile, analyze_one_async, analyze_stream_async
 import uuid, logging
 
 logger = logging.getLogger(__name__)
@@ -22,6 +23,23 @@ class SearchService:
         cons = extract_user_constraints(user or {})
         data = await analyze_one_async(cons, request)
         logging.info('data!!! : %s',data)
+        return await self._build_response(request, data)
+
+    async def search_food_stream(self, request: SimpleSearchRequest, uid: Optional[str] = None):
+        """
+        음식 검색 스트리밍 (필드가 완성될 때마다 이벤트, 마지막 done 이벤트는 search_food 와 같은 응답)
+        """
+        user = await _to_thread(get_user_profile, uid) if uid else {}
+        cons = extract_user_constraints(user or {})
+        async for ev in analyze_stream_async(cons, request):
+            if ev["event"] == "done":
+                try:
+                    ev = {"event": "done", "data": (await self._build_response(request, ev["data"])).model_dump()}
+                except Exception as e:
+                    ev = {"event": "error", "data": {"foodName": request.food_name, "error": str(e)}}
+            yield ev
+
+    async def _build_response(self, request: SimpleSearchRequest, data: dict) -> SimpleSearchResponse:
         food_id = f"{request.country}_{request.food_name}" 
 
         # 응답 생성 (AI 음식 설명 포함)
@@ -35,9 +53,11 @@ class SearchService:
                 recommendations=data.get("recommendedFor"),
                 ingredients=data.get("ingredients"),
                 allergens=data.get("allergens"),
-                imageUrl=data.get("url"),
+                imageUrl=proxy_url(data.get("url")),  # 썸네일 프록시 URL (프록시가 꺼져 있으면 원본 URL)
                 imageSource=data.get("imgSrc"),
-                culturalBackground=data.get("originCulture")
+                culturalBackground=data.get("originCulture"),
+                allergenConflicts=data.get("allergenConflicts") or [],
+                dietWarnings=data.get("dietWarnings") or []
             ),
             isSaved=False,
             searchCount=await self._get_search_count(food_id)
@@ -6,6 +6,7 @@ from app.models.food import FoodInfo
 from app.db.firestore_client import firestore_client
 from datetime import datetime
 from firebase_admin import auth
+from app.ai.fake_backends import backend_for, FakeAuth
 import logging
 
 logger = logging.getLogger(__name__)
@@ -381,11 +382,13 @@ class UserService:
 # 서비스 인스턴스 생성
 user_service = UserService()
 
+_auth = FakeAuth() if backend_for("AUTH") == "fake" else auth  # 오프라인 벤치마크용
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Optional[dict]:
     """Firebase 토큰을 검증하고 현재 사용자 정보를 반환합니다."""
     try:
         # Firebase 토큰 검증
-        decoded_token = auth.verify_id_token(credentials.credentials)
+        decoded_token = _auth.verify_id_token(credentials.credentials)
         
         # 사용자 정보 반환
         user_info = {
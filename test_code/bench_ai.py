@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import json
+import statistics
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+# 오프라인 벤치마크: 서버를 AI_BACKEND=fake 로 띄운 뒤 실행
+#   (fake 는 Gemini/Vision/이미지 검색 + Firebase Auth/Firestore 까지 대체 - 자격 증명 없이 동작)
+#   cd backend && AI_BACKEND=fake FAKE_LLM_LATENCY_MS=1800,4500 hypercorn app.main:app --bind 127.0.0.1:8000
+#   python bench_ai.py [동시요청수] [총요청수]
+# 실제 서버를 잴 때는 BENCH_TOKEN 에 유효한 Firebase ID 토큰을 넣음 (fake 인증은 아무 토큰이나 통과)
+BASE = os.getenv("BENCH_BASE_URL", "http://127.0.0.1:8000")
+TOKEN = os.getenv("BENCH_TOKEN", "bench-token")
+HEADERS = {"Authorization": f"Bearer {TOKEN}"}
+DISHES = ["Paella", "Chistorra", "Tortilla", "Gazpacho", "Churros", "Croquetas", "Pulpo", "Calamares"]
+IMG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "app", "ai", "test_img")
+IMAGES = [open(os.path.join(IMG_DIR, f), "rb").read() for f in sorted(os.listdir(IMG_DIR)) if f.endswith(".png")]
+
+def _timed(fn):
+    t0 = time.time()
+    r = fn()
+    return time.time() - t0, r.status_code
+
+def search_once(i):
+    payload = {
+        "source_language": "ES",
+        "target_language": "KR",
+        "country": "ES",
+        "food_name": DISHES[i % len(DISHES)],
+    }
+    return _timed(lambda: requests.post(f"{BASE}/api/search/", json=payload, headers=HEADERS, timeout=120))
+
+def analyze_once(i):
+    payload = {"source_language": "ES", "target_language": "EN", "food_name": DISHES[i % len(DISHES)]}
+    return _timed(lambda: requests.post(f"{BASE}/api/ai/analyze", json=payload, headers=HEADERS, timeout=120))
+
+def ocr_translate_once(i):
+    # PNG 끝(IEND) 뒤에 요청 번호를 붙여 매번 다른 업로드로 만듦 (OCR 캐시 적중만 재지 않도록, 디코드 결과는 같음)
+    data = IMAGES[i % len(IMAGES)] + str(i).encode("ascii")
+    return _timed(lambda: requests.post(f"{BASE}/api/ai/ocr-translate", data={"target_language": "KR"},
+                                        files={"file": ("menu.png", data, "image/png")},
+                                        headers=HEADERS, timeout=120))
+
+ENDPOINTS = [("/api/search", search_once), ("/api/ai/analyze", analyze_once),
+             ("/api/ai/ocr-translate", ocr_translate_once)]
+
+def report(name, results, elapsed):
+    lat = sorted(t for t, _ in results)
+    ok = sum(1 for _, s in results if s == 200)
+    codes = {}
+    for _, s in results:
+        codes[s] = codes.get(s, 0) + 1
+    p = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))]
+    print(f"{name}: n={len(lat)} ok={ok} status={codes} p50={p(0.5):.3f}s p95={p(0.95):.3f}s "
+          f"max={lat[-1]:.3f}s mean={statistics.mean(lat):.3f}s throughput={len(lat) / elapsed:.1f} req/s")
+    if ok < len(lat):
+        print(f"  WARNING: {len(lat) - ok} requests failed - 인증(BENCH_TOKEN)/AI_BACKEND 설정 확인")
+
+if __name__ == "__main__":
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    for name, fn in ENDPOINTS:
+        t0 = time.time()
+        with ThreadPoolExecutor(max_workers=concurrency) as ex:
+            results = list(ex.map(fn, range(total)))
+        report(name, results, time.time() - t0)
+
+    m = requests.get(f"{BASE}/api/ai/metrics", timeout=10).json()
+    print(json.dumps(m, indent=2, ensure_ascii=False))
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import glob
+import requests
+from urllib.parse import urlencode
+
+# Bing 이미지 결과에서 murl 추출: BeautifulSoup 전체 파싱 vs 스트리밍 정규식 스캐너
+#   cd backend && python ../test_code/bench_bing_extract.py [저장된 html ...]
+# 인자가 없으면 bing_pages/ 의 페이지를 쓰고, 비어 있으면 몇 개 받아서 저장
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from app.ai.image_fetcher import extract_murls, extract_murls_soup, MurlScanner, _UA
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bing_pages")
+QUERIES = ["Paella Valenciana", "Ramen", "Pad Thai", "Pho bo", "Bibimbap", "Tacos al pastor"]
+LIMIT = 6
+ROUNDS = 20
+
+def save_pages():
+    os.makedirs(PAGES_DIR, exist_ok=True)
+    for q in QUERIES:
+        url = "https://www.bing.com/images/search?" + urlencode({"q": q})
+        r = requests.get(url, headers={"User-Agent": _UA, "Accept-Language": "en-US,en;q=0.9"}, timeout=10)
+        path = os.path.join(PAGES_DIR, q.replace(" ", "_") + ".html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(r.text)
+        print("saved", path, len(r.text))
+
+def streamed(html, chunk=16 * 1024):
+    # 네트워크에서 청크 단위로 받는 상황 재현, limit 도달 시 중단
+    s = MurlScanner(LIMIT)
+    read = 0
+    for i in range(0, len(html), chunk):
+        read += chunk
+        if s.feed(html[i:i + chunk]):
+            break
+    return s.found, min(read, len(html))
+
+def bench(fn, html):
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(html)
+    return (time.perf_counter() - t0) / ROUNDS * 1000
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(PAGES_DIR, "*.html")))
+    if not paths:
+        save_pages()
+        paths = sorted(glob.glob(os.path.join(PAGES_DIR, "*.html")))
+
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        soup_urls = extract_murls_soup(html, LIMIT)
+        scan_urls = extract_murls(html, LIMIT)
+        stream_urls, read = streamed(html)
+        soup_ms = bench(lambda h: extract_murls_soup(h, LIMIT), html)
+        scan_ms = bench(lambda h: extract_murls(h, LIMIT), html)
+        stream_ms = bench(streamed, html)
+        same = soup_urls == scan_urls == stream_urls
+        print(f"{os.path.basename(path)}: {len(html) / 1024:.0f}KB urls={len(soup_urls)} same={same} "
+              f"soup={soup_ms:.2f}ms scan={scan_ms:.2f}ms stream={stream_ms:.2f}ms "
+              f"(read {read / 1024:.0f}KB)")
+        if not same:
+            print("  soup  :", soup_urls)
+            print("  stream:", stream_urls)
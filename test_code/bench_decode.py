@@ -0,0 +1,77 @@
+import os
+import io
+import sys
+import time
+import multiprocessing as mp
+import cv2
+import numpy as np
+from PIL import Image
+
+# 업로드 바이트 -> BGR 배열 디코드: PIL(BytesIO + exif_transpose + np.array + cvtColor) vs memoryview + cv2.imdecode
+#   cd backend && python ../test_code/bench_decode.py [사진 ...]
+# 인자가 없으면 12MP 합성 JPEG (EXIF Orientation=6, 휴대폰 세로 사진) 으로 측정
+# 최대 메모리는 방식별로 새 프로세스에서 디코드 1회 후 VmHWM(/proc/self/status, Linux) 증가분으로 잼
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from app.ai.image_preprocess import decode_image, _read_with_orientation
+
+ROUNDS = 5
+
+def synthetic_photo(w=4032, h=3024, orientation=6, seed=0):
+    rng = np.random.default_rng(seed)
+    img = rng.normal(128, 40, (h // 8, w // 8, 3)).clip(0, 255).astype(np.uint8)
+    img = cv2.resize(img, (w, h), interpolation=cv2.INTER_CUBIC)
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buf = io.BytesIO()
+    Image.fromarray(img).save(buf, format="JPEG", quality=90, exif=exif.tobytes())
+    return buf.getvalue()
+
+def decode_pil(data):
+    return _read_with_orientation(Image.open(io.BytesIO(data)))
+
+METHODS = {"pil": decode_pil, "imdecode": decode_image}
+
+def _hwm_kb():
+    # ru_maxrss 는 exec 전 부모 값을 물려받아 자식에서 쓸 수 없음
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+def _peak_child(method, data, q):
+    METHODS[method](synthetic_photo(64, 48))  # 라이브러리 초기화분은 기준에 포함
+    base = _hwm_kb()
+    METHODS[method](data)
+    q.put((_hwm_kb() - base) / 1024)
+
+def peak_mb(method, data):
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue()
+    p = ctx.Process(target=_peak_child, args=(method, data, q))
+    p.start()
+    out = q.get()
+    p.join()
+    return out
+
+def timed(fn, data):
+    fn(data)
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        out = fn(data)
+    return out, (time.perf_counter() - t0) / ROUNDS * 1000
+
+if __name__ == "__main__":
+    if sys.argv[1:]:
+        images = [(os.path.basename(p), open(p, "rb").read()) for p in sys.argv[1:]]
+    else:
+        images = [("synthetic_12mp_rot6", synthetic_photo())]
+
+    for name, data in images:
+        pil, pil_ms = timed(decode_pil, data)
+        cv, cv_ms = timed(decode_image, data)
+        same = pil.shape == cv.shape
+        diff = int(np.abs(pil.astype(np.int16) - cv).max()) if same else None
+        print(f"{name} ({len(data) / 1e6:.1f}MB): pil={pil_ms:.1f}ms imdecode={cv_ms:.1f}ms "
+              f"speedup={pil_ms / cv_ms:.2f}x shape={cv.shape} same_shape={same} max_pixel_diff={diff}")
+        print(f"  peak RSS growth: pil={peak_mb('pil', data):.1f}MB imdecode={peak_mb('imdecode', data):.1f}MB")
@@ -0,0 +1,186 @@
+import os
+import sys
+import re
+import time
+import random
+from statistics import median
+
+# OCR 레이아웃(라인 묶기 + 단어 합치기): 이전 순수 Python 구현 vs NumPy/러닝 통계 구현
+#   cd backend && python ../test_code/bench_ocr_layout.py
+# 합성 메뉴 토큰(fixture)에서 group_menu_items 출력이 같은지 확인하고 토큰 수별 시간을 비교
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from app.ai.ocr_service import group_menu_items
+
+# ---- 이전 구현 (비교용 사본) ----
+def legacy_group_lines_by_y(tokens, y_alpha=0.65, min_tol=6.0, header_cut=2.2):
+    g_h_med_all = median(t["h"] for t in tokens) # 헤더 컷(아주 큰 글자 제거) 후 전역 높이 중앙값 재추정
+    toks = [t for t in tokens if t["h"] <= header_cut * g_h_med_all] or tokens
+    g_h_med = median(t["h"] for t in toks)
+
+    base_tol = max(min_tol, g_h_med * y_alpha) # 버킷 사이즈를 전역 높이 중앙값
+    bucket_size = base_tol
+
+    def bucket_id(y):
+        return int(y // bucket_size)
+
+    lines = []  
+    buckets = {}  
+
+    for t in toks:
+        bid = bucket_id(t["cy"])
+        candidate_line_idxs = []
+        for b in (bid - 1, bid, bid + 1):  # 인접 버킷(±1)만 관찰
+            candidate_line_idxs.extend(buckets.get(b, []))
+
+        best_i, best_dy = None, None
+
+        for i in candidate_line_idxs:
+            L = lines[i]
+            h_med_line = median(L["hs"]) if L["hs"] else g_h_med
+            tol = max(min_tol, h_med_line * y_alpha)
+            dy = abs(t["cy"] - L["y"])
+            if dy <= tol and (best_dy is None or dy < best_dy):
+                best_i, best_dy = i, dy
+
+        if best_i is None: # 새 라인 생성 + 버킷 등록
+            new_idx = len(lines)
+            lines.append({"items": [t], "y": t["cy"], "hs": [t["h"]]})
+            buckets.setdefault(bid, []).append(new_idx)
+        else: # 기존 라인에 추가하고 러닝 평균 갱신
+            L = lines[best_i]
+            L["items"].append(t)
+            old_bid = bucket_id(L["y"])
+            L["y"] = 0.7 * L["y"] + 0.3 * t["cy"]  # EMA로 안정화
+            L["hs"].append(t["h"])
+            new_bid = bucket_id(L["y"])
+            if new_bid != old_bid:
+                if old_bid in buckets:
+                    buckets[old_bid] = [idx for idx in buckets[old_bid] if idx != best_i]
+                    if not buckets[old_bid]:
+                        buckets.pop(old_bid, None)
+                buckets.setdefault(new_bid, []).append(best_i)
+
+    return lines
+
+# x좌표 고려하여 이어붙이거나 분리 
+def legacy_merge_line_by_x(line_tokens, x_alpha=1.6, join_with_space=False):
+    gaps = []
+    for a, b in zip(line_tokens, line_tokens[1:]): # 라인의 인접 x 간격 분포 계산
+        gaps.append(max(0.0, b['cx'] - a['cx']))
+    gap_med = median(gaps) if gaps else (median([t['h'] for t in line_tokens]) * 0.6)
+    gap_th = gap_med * x_alpha
+
+    words = []
+    buf = [line_tokens[0]]
+    def is_number_token(token_text):
+        return re.fullmatch(r"\d+(\.\d+)?", token_text) is not None
+    
+    for prev, cur in zip(line_tokens, line_tokens[1:]):
+        dx = cur['cx'] - prev['cx']
+        if is_number_token(cur['text']):
+            if buf:
+                text = "".join(t['text'] for t in buf) if not join_with_space else " ".join(t['text'] for t in buf)
+                cx = median(t['cx'] for t in buf)
+                cy = median(t['cy'] for t in buf)
+                words.append({"text": text, "cx": cx, "cy": cy})
+            buf = []  # 숫자 토큰은 추가하지 않고 buf 초기화
+            continue
+        if dx <= gap_th: # 같은 단어로 이어붙임
+            buf.append(cur) 
+        else: # 다른 단어로 분리 
+            text = "".join(t['text'] for t in buf) if not join_with_space else " ".join(t['text'] for t in buf)
+            cx = median(t['cx'] for t in buf)
+            cy = median(t['cy'] for t in buf)
+            words.append({"text": text, "cx": cx, "cy": cy})
+            buf = [cur]
+    if buf:
+        text = "".join(t['text'] for t in buf) if not join_with_space \
+            else " ".join(t['text'] for t in buf)
+        cx = median(t['cx'] for t in buf)
+        cy = median(t['cy'] for t in buf)
+        words.append({"text": text, "cx": cx, "cy": cy})
+    return words
+
+def legacy_group_menu_items(words):
+    lines = legacy_group_lines_by_y(words)
+    merged_words = []
+    for line in lines:
+        merged_words.extend(legacy_merge_line_by_x(line["items"], x_alpha=1.6, join_with_space=False))
+    filtered_words = []
+    for w in merged_words:
+        text = w["text"]
+        if re.fullmatch(r"\d+(\.\d+)?", text):
+            continue
+        if re.search(r"[.:,/]", text):
+            continue
+        cleaned = re.sub(r"\d+(\.\d+)?", "", text).strip()
+        if cleaned and len(cleaned) > 1:
+            w["text"] = cleaned
+            filtered_words.append(w)
+    return filtered_words
+
+# ---- 합성 fixture: Vision 글자(symbol) 단위에 가까운 토큰 ----
+NAMES = ["Paella", "Tortilla", "Gazpacho", "Patatas", "Bravas", "Chistorra", "Croquetas", "Pulpo",
+         "Ramen", "Gyoza", "Bibimbap", "Pho", "Tacos", "Churros", "Crema", "Catalana"]
+
+def fixture(n_lines, seed, columns=1, words_per_line=(1, 3), price_each_column=False):
+    rng = random.Random(seed)
+    tokens = []
+    h0 = rng.choice([18, 24, 32, 40])
+    tokens.append({"text": "MENU", "cx": 500.0, "cy": 40.0, "h": h0 * 3})  # 큰 헤더
+    for i in range(n_lines):
+        y = 120 + i * h0 * 1.8 + rng.uniform(-h0 * 0.15, h0 * 0.15)
+        for col in range(columns):
+            x = 60.0 + col * 900
+            for _ in range(rng.randint(*words_per_line)):
+                word = rng.choice(NAMES)
+                for ch in word:
+                    h = h0 + rng.randint(-2, 2)
+                    tokens.append({"text": ch, "cx": x, "cy": y + rng.uniform(-2, 2), "h": h})
+                    x += h * 0.55
+                x += h0 * rng.uniform(0.8, 1.6)
+            if price_each_column or col == columns - 1:
+                tokens.append({"text": f"{rng.randint(3, 30)}.{rng.randint(0, 99):02d}",
+                               "cx": x + 120, "cy": y, "h": h0})
+    return tokens
+
+def run(fn, tokens):
+    return fn([dict(t) for t in tokens])
+
+def best_ms(fn, tokens, rounds=3):
+    best = None
+    for _ in range(rounds):
+        toks = [dict(t) for t in tokens]
+        t0 = time.perf_counter()
+        fn(toks)
+        ms = (time.perf_counter() - t0) * 1000
+        best = ms if best is None else min(best, ms)
+    return best
+
+if __name__ == "__main__":
+    same = diff = legacy_err = 0
+    for seed in range(300):
+        r = random.Random(seed)
+        toks = fixture(r.randint(3, 60), seed, columns=1 + seed % 3, words_per_line=(1, r.randint(1, 12)),
+                       price_each_column=seed % 7 == 0)
+        try:
+            old = run(legacy_group_menu_items, toks)
+        except Exception:
+            # 이전 구현은 가격 뒤에 멀리 떨어진 토큰(단마다 가격이 있는 2단 메뉴)이 오면 빈 버퍼 median 에서 예외
+            legacy_err += 1
+            continue
+        new = run(group_menu_items, toks)
+        if old == new:
+            same += 1
+        else:
+            diff += 1
+    print(f"fixtures: same={same} diff={diff} legacy_error={legacy_err}")
+
+    # 토큰 수에 따른 확장성: 라인 수 x 라인당 단어 수
+    for n_lines, wpl in ((50, 3), (200, 3), (800, 3), (50, 20), (200, 20), (200, 60)):
+        toks = fixture(n_lines, 7, words_per_line=(wpl, wpl))
+        run(group_menu_items, toks)  # numpy 지연 로딩 등 첫 호출 비용 제외
+        old_ms = best_ms(legacy_group_menu_items, toks)
+        new_ms = best_ms(group_menu_items, toks)
+        print(f"lines={n_lines} words/line={wpl} tokens={len(toks)}: legacy={old_ms:.1f}ms new={new_ms:.1f}ms "
+              f"speedup={old_ms / new_ms:.1f}x")
@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+# 문서 외곽(quad) 검출: 원본 해상도 vs 축소본 검출 + 좌표 환산
+#   cd backend && python ../test_code/bench_preprocess.py [메뉴 사진 ...]
+# 인자가 없으면 12MP 합성 사진(메뉴판 있음/없음)으로 측정
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from app.ai.image_preprocess import _detect_document_quad, _detect_document_quad_fullres, _order_points
+
+ROUNDS = 5
+
+def synthetic_menu(w=4032, h=3024, seed=0):
+    rng = np.random.default_rng(seed)
+    img = (rng.normal(60, 12, (h, w, 3))).clip(0, 255).astype(np.uint8)  # 어두운 테이블
+    quad = np.array([[w * 0.04, h * 0.03], [w * 0.96, h * 0.05],
+                     [w * 0.95, h * 0.97], [w * 0.05, h * 0.95]], dtype=np.int32)
+    cv2.fillConvexPoly(img, quad, (235, 235, 230))
+    for i in range(40):  # 메뉴 글자 줄
+        y = int(h * 0.1 + i * h * 0.02)
+        cv2.putText(img, f"Menu item {i} ........ {i * 1.5:.2f}", (int(w * 0.12), y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 2.0, (20, 20, 20), 4)
+    return img
+
+def synthetic_no_doc(w=4032, h=3024, seed=1):
+    rng = np.random.default_rng(seed)
+    img = (rng.normal(120, 30, (h, w, 3))).clip(0, 255).astype(np.uint8)
+    return cv2.GaussianBlur(img, (9, 9), 0)
+
+def timed(fn, img):
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        out = fn(img)
+    return out, (time.perf_counter() - t0) / ROUNDS * 1000
+
+def corner_error(a, b, img):
+    if a is None or b is None:
+        return "-" if a is None and b is None else "MISMATCH"
+    d = np.linalg.norm(_order_points(a) - _order_points(b), axis=1).max()
+    return f"{d:.1f}px ({d / max(img.shape[:2]) * 100:.2f}%)"
+
+if __name__ == "__main__":
+    if sys.argv[1:]:
+        images = [(os.path.basename(p), cv2.imread(p)) for p in sys.argv[1:]]
+    else:
+        images = [("synthetic_menu_12mp", synthetic_menu()), ("synthetic_no_doc_12mp", synthetic_no_doc())]
+
+    for name, img in images:
+        full, full_ms = timed(_detect_document_quad_fullres, img)
+        small, small_ms = timed(_detect_document_quad, img)
+        print(f"{name} {img.shape[1]}x{img.shape[0]}: full={full_ms:.1f}ms proxy={small_ms:.1f}ms "
+              f"speedup={full_ms / small_ms:.1f}x found={full is not None}/{small is not None} "
+              f"max corner diff={corner_error(full, small, img)}")
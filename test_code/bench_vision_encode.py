@@ -0,0 +1,135 @@
+import os
+import re
+import sys
+import difflib
+import importlib.util
+import time
+import cv2
+import numpy as np
+
+# Vision 업로드 페이로드: 이전(긴 변 2000 고정 + PNG) vs 적응형(해상도/JPEG 품질)
+#   cd backend && python ../test_code/bench_vision_encode.py [메뉴 사진 ...]
+# 두 방식의 OCR 결과 비교: 단어 재현율(이전 결과 기준) + 같은 단어의 좌표 차이(긴 변 2000 좌표 공간, px)
+#   GOOGLE_OCR_CREDENTIALS 가 있으면 Vision, 없고 rapidocr-onnxruntime 이 설치돼 있으면 RapidOCR 로 대신 측정
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from app.ai.image_preprocess import preprocess_image, resize_for_vision, encode_for_vision, VISION_LAYOUT_LONG
+
+def _key(text):
+    return re.sub(r"\s+", "", text)  # 엔진마다 띄어쓰기 인식이 흔들려서 공백은 무시
+
+DISHES = ["Paella Valenciana", "Tortilla Espanola", "Gazpacho Andaluz", "Patatas Bravas", "Pulpo Gallega",
+          "Croquetas Jamon", "Churros Chocolate", "Crema Catalana"]
+
+def synthetic(w, h, font_scale, seed=0):
+    """(이미지, 정답 텍스트)"""
+    rng = np.random.default_rng(seed)
+    img = np.full((h, w, 3), 240, np.uint8)
+    img = (img + rng.normal(0, 4, img.shape)).clip(0, 255).astype(np.uint8)
+    step = int(40 * font_scale)
+    lines = []
+    for i, y in enumerate(range(step * 2, h - step, step)):
+        lines.append(f"{DISHES[i % len(DISHES)]} {i} .... {i * 1.5:.2f}")
+        cv2.putText(img, lines[-1], (int(w * 0.05), y),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, (30, 30, 30), max(1, int(font_scale * 2)))
+    return img, "".join(_key(t) for t in lines)
+
+def legacy(img):
+    t0 = time.perf_counter()
+    out = resize_for_vision(img)
+    ok, buf = cv2.imencode(".png", out)
+    return buf.tobytes(), {"width": out.shape[1], "height": out.shape[0], "encode": time.perf_counter() - t0}
+
+def adaptive(img):
+    t0 = time.perf_counter()
+    data, info = encode_for_vision(img)
+    info["encode"] = time.perf_counter() - t0
+    return data, info
+
+def _vision_words(data, scale):
+    from google.cloud import vision
+    from app.ai.ocr_service import client, parse_annotation
+    resp = client.document_text_detection(image=vision.Image(content=data))
+    words, _ = parse_annotation(resp, scale)
+    return words
+
+_rapid = None
+
+def _rapid_words(data, scale):
+    # 오프라인 대체 엔진: 라인 단위 박스라 레이아웃 단계 없이 라인을 그대로 비교 단위로 씀
+    global _rapid
+    if _rapid is None:
+        from rapidocr_onnxruntime import RapidOCR
+        _rapid = RapidOCR()
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    result, _ = _rapid(img)
+    words = []
+    for box, txt, _score in result or []:
+        xs = [p[0] for p in box]; ys = [p[1] for p in box]
+        words.append({"text": txt, "cx": sum(xs) / 4.0 * scale, "cy": sum(ys) / 4.0 * scale})
+    return words
+
+def ocr_engine():
+    if os.getenv("GOOGLE_OCR_CREDENTIALS"):
+        return "vision", _vision_words
+    if importlib.util.find_spec("rapidocr_onnxruntime"):
+        return "rapidocr", _rapid_words
+    return None, None
+
+def ocr_words(engine, data, info):
+    scale = VISION_LAYOUT_LONG / max(info["width"], info["height"])
+    t0 = time.perf_counter()
+    words = engine(data, scale)
+    return words, time.perf_counter() - t0
+
+def _reading_text(words):
+    return "".join(_key(w["text"]) for w in sorted(words, key=lambda w: (round(w["cy"] / 10), w["cx"])))
+
+def _similarity(a, b):
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+def compare(old_words, new_words):
+    """(재현율, 글자 유사도, 일치 수, 좌표 차이 중앙값 px) - 같은 텍스트는 가까운 것끼리 1:1 매칭"""
+    pool = {}
+    for w in new_words:
+        pool.setdefault(_key(w["text"]), []).append(w)
+    hit, dists = 0, []
+    for w in old_words:
+        cands = pool.get(_key(w["text"]))
+        if not cands:
+            continue
+        best = min(cands, key=lambda c: abs(c["cx"] - w["cx"]) + abs(c["cy"] - w["cy"]))
+        cands.remove(best)
+        hit += 1
+        dists.append(max(abs(best["cx"] - w["cx"]), abs(best["cy"] - w["cy"])))
+    recall = hit / len(old_words) if old_words else 1.0
+    chars = _similarity(_reading_text(old_words), _reading_text(new_words))
+    return recall, chars, hit, float(np.median(dists)) if dists else 0.0
+
+if __name__ == "__main__":
+    if sys.argv[1:]:
+        images = [(os.path.basename(p), preprocess_image(open(p, "rb").read(), resize=False), None)
+                  for p in sys.argv[1:]]
+    else:
+        images = [("small_big_text_800x600", *synthetic(800, 600, 1.2)),
+                  ("phone_12mp_big_text", *synthetic(4032, 3024, 4.0)),
+                  ("phone_12mp_small_text", *synthetic(4032, 3024, 1.0))]
+    engine_name, engine = ocr_engine()
+    if engine is None:
+        print("OCR 엔진 없음 (GOOGLE_OCR_CREDENTIALS 또는 rapidocr-onnxruntime) - 크기/인코딩만 비교")
+
+    for name, img, truth in images:
+        old, oi = legacy(img)
+        new, ni = adaptive(img)
+        print(f"{name} {img.shape[1]}x{img.shape[0]}")
+        print(f"  legacy  : {oi['width']}x{oi['height']} png {len(old) / 1024:.0f}KB encode={oi['encode'] * 1000:.0f}ms")
+        print(f"  adaptive: {ni['width']}x{ni['height']} {ni['format']} q={ni['quality']} textPx={ni['textPx']} "
+              f"{len(new) / 1024:.0f}KB encode={ni['encode'] * 1000:.0f}ms ({len(old) / max(1, len(new)):.1f}x smaller)")
+        if engine is not None:
+            ow, ot = ocr_words(engine, old, oi)
+            nw, nt = ocr_words(engine, new, ni)
+            recall, chars, hit, dxy = compare(ow, nw)
+            print(f"  {engine_name:<8}: legacy={ot:.2f}s adaptive={nt:.2f}s words {len(ow)} vs {len(nw)} "
+                  f"recall={recall:.3f} chars={chars:.3f} coord_diff_median={dxy:.1f}px ({hit} matched)")
+            if truth is not None:  # 합성 이미지는 정답 대비 글자 정확도
+                print(f"  vs truth: legacy={_similarity(truth, _reading_text(ow)):.3f} "
+                      f"adaptive={_similarity(truth, _reading_text(nw)):.3f}")